@@ -0,0 +1,428 @@
+"""Append-only, columnar log of answer verdicts and the analytics over it.
+
+Each process appends to its own directory of column files (one raw
+little-endian array per column), so gunicorn workers never contend for a
+file and a reader can np.fromfile() every column in one go. A crash can
+leave the columns of one writer at different lengths; readers and the next
+writer both cut them back to the shortest one.
+"""
+
+import glob
+import os
+import sys
+import threading
+import time
+import zlib
+from array import array
+
+import numpy as np
+
+from payloads import WORDS_PER_LEVEL
+
+VERDICTS = ('correct', 'accent_only_miss', 'article_miss', 'near_miss', 'incorrect')
+STRICTNESS = ('low', 'medium', 'high', 'other')
+
+# name, array typecode, numpy dtype
+COLUMNS = (
+    ('ts', 'd', '<f8'),
+    ('user', 'I', '<u4'),
+    ('word', 'i', '<i4'),
+    ('verdict', 'B', 'u1'),
+    ('correct', 'B', 'u1'),
+    ('strictness', 'B', 'u1'),
+)
+
+
+def strictness_label(strictness):
+    """A known strictness level, or 'other' for anything a client made up."""
+    return strictness if strictness in STRICTNESS[:-1] else STRICTNESS[-1]
+
+
+def user_key(user_id):
+    return zlib.crc32(user_id.encode('utf-8'))
+
+
+class AnswerLog:
+    """Buffered writer for this process's share of the answer event log.
+
+    Events are buffered in memory and appended to disk once `flush_every`
+    are pending or `flush_interval` seconds have passed since the last
+    write, and on flush().
+    """
+
+    def __init__(self, directory, flush_every=256, flush_interval=5.0):
+        self.directory = directory
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._buffers = {name: array(code) for name, code, _ in COLUMNS}
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self._pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, user_id, word_id, verdict, correct, strictness):
+        try:
+            word = int(word_id)
+        except (TypeError, ValueError):
+            return
+        strictness = STRICTNESS.index(strictness_label(strictness))
+        row = (time.time(), user_key(user_id), word, VERDICTS.index(verdict), 1 if correct else 0, strictness)
+        with self._lock:
+            for (name, _, _), value in zip(COLUMNS, row):
+                self._buffers[name].append(value)
+            pending = len(self._buffers['ts'])
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if pending >= self.flush_every or due:
+            self.flush()
+
+    def _writer_dir(self):
+        # One directory per pid; trim columns that a crashed writer with the same pid left uneven
+        path = os.path.join(self.directory, f'writer-{os.getpid()}')
+        if self._pid != os.getpid():
+            os.makedirs(path, exist_ok=True)
+            _trim_columns(path)
+            self._pid = os.getpid()
+        return path
+
+    def flush(self):
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            if not self._buffers['ts']:
+                return
+            path = self._writer_dir()
+            for name, code, _ in COLUMNS:
+                column = self._buffers[name]
+                if sys.byteorder != 'little':
+                    column.byteswap()
+                with open(os.path.join(path, name), 'ab') as f:
+                    column.tofile(f)
+                self._buffers[name] = array(code)
+
+    def read(self):
+        """Every logged event as a dict of equal-length numpy columns."""
+        return self.read_since({})
+
+    def read_since(self, offsets):
+        """The events appended since `offsets` (writer directory -> rows already
+        read), which is advanced past them. None if a writer already read from
+        has lost rows since, so the caller has to start again from {}.
+        """
+        self.flush()
+        parts = {name: [] for name, _, _ in COLUMNS}
+        paths = sorted(glob.glob(os.path.join(self.directory, 'writer-*')))
+        if not set(offsets) <= set(paths):
+            return None
+        for path in paths:
+            start = offsets.get(path, 0)
+            length = min(_column_lengths(path))
+            if length < start:
+                return None
+            columns = _read_columns(path, start, length)
+            for name in parts:
+                parts[name].append(columns[name])
+            offsets[path] = length
+        return {
+            name: np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype)
+            for name, _, dtype in COLUMNS
+        }
+
+
+def _column_lengths(path):
+    lengths = []
+    for name, _, dtype in COLUMNS:
+        try:
+            size = os.path.getsize(os.path.join(path, name))
+        except OSError:
+            size = 0
+        lengths.append(size // np.dtype(dtype).itemsize)
+    return lengths
+
+
+def _trim_columns(path):
+    length = min(_column_lengths(path))
+    for name, _, dtype in COLUMNS:
+        column = os.path.join(path, name)
+        if os.path.exists(column):
+            os.truncate(column, length * np.dtype(dtype).itemsize)
+
+
+def _read_columns(path, start, length):
+    return {
+        name: np.fromfile(
+            os.path.join(path, name), dtype=dtype, count=length - start, offset=start * np.dtype(dtype).itemsize)
+        if length > start else np.empty(0, dtype)
+        for name, _, dtype in COLUMNS
+    }
+
+
+def build_word_lookup(catalog):
+    """Per-word category code and level, in arrays indexed by word id.
+
+    Word ids are small dense integers, so a direct table beats a search.
+    Ids with no word map to slot -1.
+    """
+    ids = np.fromiter((int(w['id']) for w in catalog.words), dtype=np.int64, count=len(catalog.words))
+    ranks = np.fromiter((w['rank'] for w in catalog.words), dtype=np.int64, count=len(catalog.words))
+    categories = sorted({w['category'] for w in catalog.words})
+    codes = {c: i for i, c in enumerate(categories)}
+    category = np.fromiter((codes[w['category']] for w in catalog.words), dtype=np.int64, count=len(catalog.words))
+    slot = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int64)
+    slot[ids] = np.arange(len(ids))
+    return {
+        'slot': slot,
+        'category': category,
+        'level': (ranks - 1) // WORDS_PER_LEVEL + 1,
+        'categories': categories,
+    }
+
+
+# Mastery state kept per (user, word) pair: name, numpy dtype. A pair not
+# yet mastered has mastered_attempts 0; its strictness is that of its last
+# answer, and of the answer that mastered it once it is mastered.
+PAIR_STATE = (
+    ('word', '<i8'),
+    ('attempts', '<i8'),
+    ('right', '<i8'),
+    ('streak', '<i8'),
+    ('first_ts', '<f8'),
+    ('mastered_attempts', '<i8'),
+    ('mastered_seconds', '<f8'),
+    ('strictness', 'u1'),
+)
+
+# Totals kept per (word, strictness): answers and right answers, and the
+# pairs grouped there with how many are mastered, in how many answers and
+# seconds in all
+WORD_TOTALS = (
+    ('answers', '<i8'),
+    ('right', '<i8'),
+    ('pairs', '<i8'),
+    ('mastered', '<i8'),
+    ('mastered_attempts', '<i8'),
+    ('mastered_seconds', '<f8'),
+)
+
+# New pair keys go to a small sorted index that is merged into the big one
+# once it holds this share of it, so adding a pair costs O(1) amortized
+RECENT_PAIRS_SHARE = 8
+
+
+class AnswerStats:
+    """Running totals over the answer log, behind the analytics report.
+
+    Keeps the is_mastered() state of every (user, word) pair (answers,
+    right answers and streak so far, when it was first answered and, once
+    the rules were first met, the answers and seconds that took) and the
+    report's totals per word and strictness. Each report folds in only the
+    rows appended to each writer's columns since the last one, sorting
+    just those and updating just the pairs they touch, then sums the
+    per-word totals by group; it never goes back over the whole log.
+    Reports are cached until new events come in or the catalog lookup
+    changes.
+
+    New rows are folded in after the ones already counted, in time order
+    among themselves: an answer that was still buffered in another worker
+    when a later one was counted is taken as the later of the two.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self._lock = threading.Lock()
+        self._start_over()
+
+    def _start_over(self):
+        self._offsets = {}
+        self._folded = 0
+        self._report = None
+        self.word_ids = np.empty(0, np.int64)
+        self.words = {name: np.zeros((0, len(STRICTNESS)), dtype) for name, dtype in WORD_TOTALS}
+        # Pair rows are append-only; (keys, rows) indexes map a packed user/word key to its row
+        self.pair_count = 0
+        self.pairs = {name: np.zeros(0, dtype) for name, dtype in PAIR_STATE}
+        self._pair_index = (np.empty(0, np.uint64), np.empty(0, np.int64))
+        self._recent_pairs = (np.empty(0, np.uint64), np.empty(0, np.int64))
+
+    def report(self, lookup):
+        """Accuracy and time-to-mastery by category, 1,000-word level and strictness."""
+        with self._lock:
+            events = self.log.read_since(self._offsets)
+            if events is None:
+                # A writer's columns went away or shrank; count everything again
+                self._start_over()
+                events = self.log.read_since(self._offsets)
+            if len(events['ts']):
+                self._fold(events)
+                self._folded += len(events['ts'])
+            if self._report is None or self._report[0] is not lookup or self._report[1] != self._folded:
+                self._report = (lookup, self._folded, summarize(self, lookup))
+            return self._report[2]
+
+    def _fold(self, events):
+        keep = events['word'] >= 0
+        user, word, ts = events['user'][keep], events['word'][keep].astype(np.int64), events['ts'][keep]
+        correct, strictness = events['correct'][keep].astype(bool), events['strictness'][keep]
+
+        words, inverse = np.unique(word, return_inverse=True)
+        self.word_ids, rows = _merge_keys(self.word_ids, self.words, words)
+        cells = rows[inverse] * len(STRICTNESS) + strictness
+        self._add('answers', cells, None)
+        self._add('right', cells, correct)
+
+        # Two stable argsorts (time, then one packed user/word key) beat lexsort on three keys
+        pair_key = (user.astype(np.uint64) << np.uint64(32)) | word.astype(np.uint64)
+        order = np.argsort(ts, kind='stable')
+        order = order[np.argsort(pair_key[order], kind='stable')]
+        pair_key, ts, correct, strictness = pair_key[order], ts[order], correct[order], strictness[order]
+        n = len(order)
+        idx = np.arange(n)
+        new_pair = np.ones(n, dtype=bool)
+        new_pair[1:] = pair_key[1:] != pair_key[:-1]
+        starts = np.flatnonzero(new_pair)
+        ends = np.append(starts[1:], n) - 1
+        pair_start = np.maximum.accumulate(np.where(new_pair, idx, 0))
+
+        rows = self._pair_rows(pair_key[starts])
+        pairs = self.pairs
+        pairs['word'][rows] = word[order][starts]
+        self._tally_pairs(rows, -1)
+        row = rows[np.cumsum(new_pair) - 1]
+        before = idx - pair_start
+
+        # Carry on from each pair's state before these events
+        attempt = pairs['attempts'][row] + before + 1
+        right = np.cumsum(correct)
+        right_so_far = pairs['right'][row] + right - right[pair_start] + correct[pair_start]
+        last_miss = np.maximum.accumulate(np.where(~correct, idx, pair_start - 1))
+        streak = np.where(last_miss >= pair_start, idx - last_miss, pairs['streak'][row] + before + 1)
+        first_ts = np.where(pairs['attempts'][rows] == 0, ts[starts], pairs['first_ts'][rows])
+
+        # Mirrors is_mastered(): right on the first try, a streak of 3, or 5+ answers at 80%+
+        mastered = ((attempt == 1) & correct) | (streak >= 3) | ((attempt >= 5) & (right_so_far * 5 >= attempt * 4))
+        mastered &= pairs['mastered_attempts'][row] == 0
+        first_hit = np.minimum.reduceat(np.where(mastered, idx, n), starts)
+        hit = first_hit < n
+        pairs['mastered_attempts'][rows[hit]] = attempt[first_hit[hit]]
+        pairs['mastered_seconds'][rows[hit]] = ts[first_hit[hit]] - first_ts[hit]
+        pairs['strictness'][rows[hit]] = strictness[first_hit[hit]]
+        open_pairs = pairs['mastered_attempts'][rows] == 0
+        pairs['strictness'][rows[open_pairs]] = strictness[ends[open_pairs]]
+        pairs['first_ts'][rows] = first_ts
+        pairs['attempts'][rows] = attempt[ends]
+        pairs['right'][rows] = right_so_far[ends]
+        pairs['streak'][rows] = streak[ends]
+        self._tally_pairs(rows, 1)
+
+    def _pair_rows(self, keys):
+        """Rows of the sorted, unique pair `keys`, appending zeroed rows for new ones."""
+        rows = np.full(len(keys), -1, np.int64)
+        for index_keys, index_rows in (self._pair_index, self._recent_pairs):
+            at = np.searchsorted(index_keys, keys)
+            found = at < len(index_keys)
+            found[found] = index_keys[at[found]] == keys[found]
+            rows[found] = index_rows[at[found]]
+        missing = rows < 0
+        if missing.any():
+            count = self.pair_count + int(missing.sum())
+            if count > len(self.pairs['attempts']):
+                capacity = max(count, 2 * len(self.pairs['attempts']))
+                for name, column in self.pairs.items():
+                    grown = np.zeros(capacity, column.dtype)
+                    grown[:self.pair_count] = column[:self.pair_count]
+                    self.pairs[name] = grown
+            rows[missing] = np.arange(self.pair_count, count)
+            self.pair_count = count
+            self._recent_pairs = _insert_sorted(self._recent_pairs, keys[missing], rows[missing])
+            if len(self._recent_pairs[0]) * RECENT_PAIRS_SHARE > len(self._pair_index[0]):
+                self._pair_index = _insert_sorted(self._pair_index, *self._recent_pairs)
+                self._recent_pairs = (np.empty(0, np.uint64), np.empty(0, np.int64))
+        return rows
+
+    def _add(self, name, cells, weights, sign=1):
+        column = self.words[name]
+        counts = np.bincount(cells, weights=weights, minlength=column.size).reshape(column.shape)
+        column += (sign * counts).astype(column.dtype)
+
+    def _tally_pairs(self, rows, sign):
+        # Add (or take back) these pairs' share of their (word, strictness) totals
+        pairs = self.pairs
+        word_rows = np.searchsorted(self.word_ids, pairs['word'][rows])
+        cells = word_rows * len(STRICTNESS) + pairs['strictness'][rows]
+        attempts = pairs['mastered_attempts'][rows]
+        self._add('pairs', cells, pairs['attempts'][rows] > 0, sign)
+        self._add('mastered', cells, attempts > 0, sign)
+        self._add('mastered_attempts', cells, attempts, sign)
+        self._add('mastered_seconds', cells, pairs['mastered_seconds'][rows], sign)
+
+
+def _merge_keys(keys, table, new_keys):
+    """Add the sorted, unique `new_keys` to the sorted `keys`, inserting a
+    zeroed row in every column of `table` for each one not there yet.
+    Returns the merged keys and the row of each of `new_keys`."""
+    at = np.searchsorted(keys, new_keys)
+    found = at < len(keys)
+    found[found] = keys[at[found]] == new_keys[found]
+    if not found.all():
+        missing = new_keys[~found]
+        spots = np.searchsorted(keys, missing)
+        keys = np.insert(keys, spots, missing)
+        for name, column in table.items():
+            table[name] = np.insert(column, spots, 0, axis=0)
+        at = np.searchsorted(keys, new_keys)
+    return keys, at
+
+
+def _insert_sorted(index, keys, rows):
+    # Merge sorted `keys` (and their rows) into a sorted (keys, rows) index
+    index_keys, index_rows = index
+    spots = np.searchsorted(index_keys, keys)
+    return np.insert(index_keys, spots, keys), np.insert(index_rows, spots, rows)
+
+
+def _group_stats(groups, totals):
+    stats = {}
+    for i, group in enumerate(groups):
+        answered, done = int(totals['answers'][i]), int(totals['mastered'][i])
+        if not answered:
+            continue
+        stats[str(group)] = {
+            'answers': answered,
+            'accuracy': round(float(totals['right'][i]) / answered * 100, 1),
+            'words_practiced': int(totals['pairs'][i]),
+            'words_mastered': done,
+            'avg_answers_to_mastery': round(float(totals['mastered_attempts'][i]) / done, 2) if done else None,
+            'avg_seconds_to_mastery': round(float(totals['mastered_seconds'][i]) / done, 1) if done else None,
+        }
+    return stats
+
+
+def summarize(stats, lookup):
+    """The analytics report from an AnswerStats' per-word totals.
+
+    Grouping is a few bincounts over the words, so the report costs the
+    same however many events are logged. Events for words no longer in the
+    catalog are left out.
+    """
+    slot = lookup['slot']
+    word_ids = stats.word_ids
+    if len(slot):
+        in_range = (word_ids >= 0) & (word_ids < len(slot))
+        positions = np.where(in_range, slot[np.where(in_range, word_ids, 0)], -1)
+    else:
+        positions = np.full(len(word_ids), -1, np.int64)
+    known = positions >= 0
+    totals = {name: column[known] for name, column in stats.words.items()}
+    category, level = lookup['category'][positions[known]], lookup['level'][positions[known]]
+    per_word = {name: column.sum(axis=1) for name, column in totals.items()}
+
+    def by(codes, size):
+        return {name: np.bincount(codes, weights=column, minlength=size) for name, column in per_word.items()}
+
+    n = int(per_word['answers'].sum())
+    top_level = int(level.max()) if len(level) else 0
+    return {
+        'events': n,
+        'accuracy': round(float(per_word['right'].sum()) / n * 100, 1) if n else 0.0,
+        'by_category': _group_stats(lookup['categories'], by(category, len(lookup['categories']))),
+        'by_level': _group_stats(range(top_level + 1), by(level, top_level + 1)),
+        'by_strictness': _group_stats(STRICTNESS, {name: column.sum(axis=0) for name, column in totals.items()}),
+    }
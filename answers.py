@@ -0,0 +1,303 @@
+import re
+import unicodedata
+
+# Near misses: answers one typo (insertion, deletion, substitution or
+# transposition of adjacent letters) away from an accepted answer, compared
+# case- and accent-insensitively. Shorter answers are too easy to confuse.
+MAX_TYPO_DISTANCE = 1
+MIN_TYPO_LENGTH = 4
+ARTICLES = ('el', 'la', 'los', 'las', 'un', 'una')
+
+# Notes such as '(helper verb)' or '[indirect object]' in an English gloss
+GLOSS_NOTES = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+GLOSS_SEPARATORS = re.compile(r'[,;/]')
+
+def normalize_answer(answer):
+    """Normalize answer for comparison."""
+    return answer.strip().lower()
+
+def remove_accents(text):
+    """Remove accent marks from text for loose comparison."""
+    nfkd = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in nfkd if not unicodedata.combining(c))
+
+def build_article_answers(correct_answers, article):
+    """Return correct answers prefixed with the required article."""
+    return [f"{article} {ans}" for ans in correct_answers]
+
+def typo_candidates(normalized_answer):
+    """Accent-folded forms of an answer to compare for near misses, with and without a leading article."""
+    folded = remove_accents(normalized_answer)
+    candidates = [folded]
+    first, _, rest = folded.partition(' ')
+    if rest.strip() and first in ARTICLES:
+        candidates.append(rest.strip())
+    return candidates
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance between a and b, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def is_near_miss(normalized_user, correct_answers):
+    """True if the answer is within a typo of one of correct_answers."""
+    folded_answers = [remove_accents(normalize_answer(a)) for a in correct_answers]
+    for candidate in typo_candidates(normalized_user):
+        for answer in folded_answers:
+            if len(answer) >= MIN_TYPO_LENGTH and edit_distance(candidate, answer, MAX_TYPO_DISTANCE) <= MAX_TYPO_DISTANCE:
+                return True
+    return False
+
+def check_answer_match(user_answer, correct_answers, strictness='high', word=None):
+    """Check if user's answer matches any correct answer.
+
+    Returns a dict: {'correct': bool, 'accent_only_miss': bool, 'article_miss': bool, 'near_miss': bool}.
+    accent_only_miss is True when the answer would be correct if accents are ignored.
+    article_miss is True when the noun answer is correct but the article was missing/wrong.
+    near_miss is True when a wrong answer is a typo away from a correct one.
+    """
+    normalized_user = normalize_answer(user_answer)
+
+    # For high strictness on nouns: require correct article prefix
+    if strictness == 'high' and word and word.get('category') == 'noun' and word.get('article'):
+        article = word['article']
+        article_answers = build_article_answers(correct_answers, article)
+
+        for correct in article_answers:
+            if normalize_answer(correct) == normalized_user:
+                return {'correct': True, 'accent_only_miss': False, 'article_miss': False, 'near_miss': False}
+
+        # Check if they got the noun right but forgot the article
+        for correct in correct_answers:
+            if normalize_answer(correct) == normalized_user:
+                return {'correct': False, 'accent_only_miss': False, 'article_miss': True, 'near_miss': False}
+
+        near_miss = is_near_miss(normalized_user, correct_answers)
+        return {'correct': False, 'accent_only_miss': False, 'article_miss': False, 'near_miss': near_miss}
+
+    # Medium and low strictness: standard matching without article requirement
+    for correct in correct_answers:
+        if normalize_answer(correct) == normalized_user:
+            return {'correct': True, 'accent_only_miss': False, 'article_miss': False, 'near_miss': False}
+
+    if strictness == 'low':
+        user_no_accents = remove_accents(normalized_user)
+        for correct in correct_answers:
+            if remove_accents(normalize_answer(correct)) == user_no_accents:
+                return {'correct': True, 'accent_only_miss': True, 'article_miss': False, 'near_miss': False}
+
+    near_miss = is_near_miss(normalized_user, correct_answers)
+    return {'correct': False, 'accent_only_miss': False, 'article_miss': False, 'near_miss': near_miss}
+
+def _verdict(correct=False, accent_only_miss=False, article_miss=False, near_miss=False):
+    return {
+        'correct': correct,
+        'accent_only_miss': accent_only_miss,
+        'article_miss': article_miss,
+        'near_miss': near_miss,
+    }
+
+def requires_article(word):
+    """High strictness nouns must be answered with their article."""
+    return word.get('category') == 'noun' and bool(word.get('article'))
+
+class AnswerEntry:
+    """Accepted answers for one word, normalized once per strictness level."""
+
+    __slots__ = ('exact', 'with_article', 'folded')
+
+    def __init__(self, word):
+        correct_answers = word['spanish']
+        self.exact = frozenset(normalize_answer(a) for a in correct_answers)
+        self.folded = frozenset(remove_accents(a) for a in self.exact)
+        if requires_article(word):
+            self.with_article = frozenset(
+                normalize_answer(a) for a in build_article_answers(correct_answers, word['article'])
+            )
+        else:
+            self.with_article = None
+
+    def match(self, user_answer, strictness='high', near_misses=None):
+        """Same verdicts as check_answer_match, using set lookups.
+
+        Pass the catalog's NearMissIndex as near_misses to look typos up in
+        it; without one the word's own answers are compared directly.
+        """
+        normalized_user = normalize_answer(user_answer)
+
+        if strictness == 'high' and self.with_article is not None:
+            if normalized_user in self.with_article:
+                return _verdict(correct=True)
+            if normalized_user in self.exact:
+                return _verdict(article_miss=True)
+            return _verdict(near_miss=self.near_miss(normalized_user, near_misses))
+
+        if normalized_user in self.exact:
+            return _verdict(correct=True)
+
+        if strictness == 'low' and remove_accents(normalized_user) in self.folded:
+            return _verdict(correct=True, accent_only_miss=True)
+
+        return _verdict(near_miss=self.near_miss(normalized_user, near_misses))
+
+    def near_miss(self, normalized_user, near_misses=None):
+        if near_misses is None:
+            return is_near_miss(normalized_user, self.exact)
+        return any(
+            not self.folded.isdisjoint(near_misses.lookup(candidate))
+            for candidate in typo_candidates(normalized_user)
+        )
+
+def build_answer_index(catalog):
+    """Map word id -> AnswerEntry for every word in the catalog."""
+    return {word_id: AnswerEntry(word) for word_id, word in catalog.by_id.items()}
+
+def _deletes(text, distance):
+    """text plus every string made by deleting up to `distance` characters from it."""
+    found = {text}
+    frontier = [text]
+    for _ in range(distance):
+        frontier = [s[:i] + s[i + 1:] for s in frontier for i in range(len(s))]
+        found.update(frontier)
+    return found
+
+class NearMissIndex:
+    """SymSpell-style deletes index over every accepted answer in the catalog.
+
+    Each accepted form (normalized and accent-folded) is stored under every
+    string obtained by deleting up to MAX_TYPO_DISTANCE characters from it.
+    Two strings within that distance always share such a key, so a lookup
+    only generates the deletes of the user's answer and verifies the few
+    forms found under them, instead of comparing against every answer.
+    """
+
+    def __init__(self, forms, max_distance=MAX_TYPO_DISTANCE):
+        self.max_distance = max_distance
+        self.longest = 0
+        deletes = {}
+        for form in forms:
+            if len(form) < MIN_TYPO_LENGTH:
+                continue
+            self.longest = max(self.longest, len(form))
+            for key in _deletes(form, max_distance):
+                # Most keys hold a single form, so skip the list until needed
+                held = deletes.get(key)
+                if held is None:
+                    deletes[key] = form
+                elif isinstance(held, str):
+                    deletes[key] = [held, form]
+                else:
+                    held.append(form)
+        self.deletes = deletes
+
+    def __len__(self):
+        return len(self.deletes)
+
+    def lookup(self, text):
+        """Accepted forms within max_distance of text (already folded)."""
+        limit = self.max_distance
+        found = set()
+        if len(text) > self.longest + limit:
+            # Its deletes are all longer than every key; don't build them
+            return found
+        for key in _deletes(text, limit):
+            held = self.deletes.get(key)
+            if held is None:
+                continue
+            for form in ((held,) if isinstance(held, str) else held):
+                if form not in found and edit_distance(text, form, limit) <= limit:
+                    found.add(form)
+        return found
+
+def build_near_miss_index(catalog):
+    """NearMissIndex over the accepted answers of every word in the catalog."""
+    forms = set()
+    for word in catalog.words:
+        forms.update(remove_accents(normalize_answer(a)) for a in word['spanish'])
+    return NearMissIndex(forms)
+
+def normalize_gloss(text):
+    """Case-, accent- and spacing-insensitive form of an English answer."""
+    return ' '.join(remove_accents(normalize_answer(text)).strip('.!?').split())
+
+def gloss_answers(english):
+    """Accepted English answers for a gloss such as 'to be able to, can' or 'his/her/their/your'.
+
+    Every comma-, semicolon- or slash-separated alternative counts, with
+    notes in brackets dropped; verbs are also accepted without 'to'.
+    """
+    answers = set()
+    for part in GLOSS_SEPARATORS.split(GLOSS_NOTES.sub(' ', english)):
+        gloss = normalize_gloss(part)
+        if not gloss:
+            continue
+        answers.add(gloss)
+        if gloss.startswith('to ') and len(gloss) > 3:
+            answers.add(gloss[3:])
+    return frozenset(answers)
+
+def reverse_prompt(word):
+    """The Spanish form shown in reverse mode: the first answer, with its article for nouns."""
+    form = word['spanish'][0]
+    return f"{word['article']} {form}" if requires_article(word) else form
+
+class ReverseIndex:
+    """Inverted indexes for the Spanish -> English direction, built once per catalog.
+
+    by_form maps each normalized Spanish form to the ids of the words that
+    have it, and by_gloss each normalized English gloss to the ids of the
+    words it translates. An answer is right when it glosses any word that
+    shares the prompt's Spanish form ('la' is 'the' or 'her'), which is two
+    hash lookups and a set intersection.
+    """
+
+    def __init__(self, catalog):
+        by_form = {}
+        by_gloss = {}
+        self.forms = {}
+        self.glosses = {}
+        for word_id, word in catalog.by_id.items():
+            form = normalize_answer(word['spanish'][0])
+            self.forms[word_id] = form
+            for answer in word['spanish']:
+                by_form.setdefault(normalize_answer(answer), set()).add(word_id)
+            glosses = gloss_answers(word['english'])
+            self.glosses[word_id] = glosses
+            for gloss in glosses:
+                by_gloss.setdefault(gloss, set()).add(word_id)
+        self.by_form = {form: frozenset(ids) for form, ids in by_form.items()}
+        self.by_gloss = {gloss: frozenset(ids) for gloss, ids in by_gloss.items()}
+
+    def match(self, word_id, user_answer):
+        """Verdict for an English answer to the word's Spanish prompt (same shape as AnswerEntry.match)."""
+        answer = normalize_gloss(user_answer)
+        candidates = [answer]
+        if answer.startswith('to '):
+            candidates.append(answer[3:])
+        same_form = self.by_form.get(self.forms[word_id], frozenset((word_id,)))
+        for candidate in candidates:
+            if not same_form.isdisjoint(self.by_gloss.get(candidate, ())):
+                return _verdict(correct=True)
+        near_miss = any(
+            len(gloss) >= MIN_TYPO_LENGTH and edit_distance(candidate, gloss, MAX_TYPO_DISTANCE) <= MAX_TYPO_DISTANCE
+            for other in same_form
+            for gloss in self.glosses[other]
+            for candidate in candidates
+        )
+        return _verdict(near_miss=near_miss)
+
+def build_reverse_index(catalog):
+    return ReverseIndex(catalog)
@@ -1,59 +1,152 @@
-from flask import Flask, jsonify, request, render_template
-import json
+from flask import Flask, g, jsonify, request, render_template
+import atexit
 import os
 import random
-import unicodedata
-from datetime import datetime
+import re
+import secrets
+import time
+
+from answers import (
+    build_answer_index,
+    build_near_miss_index,
+    build_reverse_index,
+)
+from answer_log import AnswerLog, AnswerStats, build_word_lookup, strictness_label
+from decks import DEFAULT_DECK, DeckCache, UnknownDeck
+from payloads import AnswerPayloads, CardPayloads, build_words_payload, encode_json, max_level, reverse_listing
+from learner_index import ACTIVE, SCHEDULING_MODES, empty_counts
+from metrics import metrics
+from progress_store import ProgressStore, valid_record
+from review_sessions import ReviewSessionStore
+from search_index import build_search_index
+from user_state import UserStateCache
 
 app = Flask(__name__)
 
-WORDS_FILE = 'words.json'
-PROGRESS_FILE = 'user_progress.json'
+# File locations can be overridden from the environment (used by scripts/bench.py)
+WORDS_FILE = os.environ.get('WORDS_FILE', 'words.json')
+PROGRESS_FILE = os.environ.get('PROGRESS_FILE', 'user_progress.json')
+PROGRESS_DIR = os.environ.get('PROGRESS_DIR', 'progress')
+ANSWER_LOG_DIR = os.environ.get('ANSWER_LOG_DIR', 'answer_log')
+DECKS_DIR = os.environ.get('DECKS_DIR', 'decks')
+DECK_CACHE_MB = int(os.environ.get('DECK_CACHE_MB', '128'))
+USER_COOKIE = 'fq_user'
+USER_COOKIE_MAX_AGE = 5 * 365 * 24 * 3600
+VALID_USER_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+# Quiz directions: English prompt -> Spanish answer, or Spanish -> English.
+# Reverse-mode progress is kept as a separate learner whose id adds a
+# suffix no real user id can contain.
+FORWARD = 'forward'
+REVERSE = 'reverse'
+DIRECTIONS = (FORWARD, REVERSE)
+REVERSE_USER_SUFFIX = '.reverse'
+
+# Decks: WORDS_FILE is the default deck; more decks (other languages,
+# regional variants, custom lists) are DECKS_DIR/<name>.json, loaded per
+# worker on first use and kept within DECK_CACHE_MB. Progress in a deck
+# other than the default is kept as a separate learner, like reverse mode.
+DECK_USER_PREFIX = '.deck-'
+
+def forget_deck_learners(deck):
+    """Drop the cached learners of an unloaded deck; their indexes keep its catalog alive."""
+    suffixes = (DECK_USER_PREFIX + deck, DECK_USER_PREFIX + deck + REVERSE_USER_SUFFIX)
+    user_states.evict(lambda user_id: user_id.endswith(suffixes))
+
+decks = DeckCache(WORDS_FILE, DECKS_DIR, DECK_CACHE_MB * 1024 * 1024, on_evict=forget_deck_learners)
+catalog = decks.default
+
+@metrics.timed('load_words')
+def get_catalog(deck=None):
+    """Return the requested deck's catalog, reloading it if its file changed."""
+    return decks.get(deck or current_deck())
 
 def load_words():
-    with open(WORDS_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)['words']
-
-# JSON-based progress functions for local development
-def load_progress_json():
-    if not os.path.exists(PROGRESS_FILE):
-        return {
-            'user_stats': {
-                'total_practiced': 0,
-                'total_correct': 0,
-                'session_count': 1,
-                'last_session': datetime.now().isoformat()
-            },
-            'word_progress': {},
-            'settings': {'strictness': 'medium'}
-        }
-    with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-        progress = json.load(f)
-    if 'settings' not in progress:
-        progress['settings'] = {'strictness': 'medium'}
-    if 'theme' not in progress['settings']:
-        progress['settings']['theme'] = 'default'
-    return progress
-
-def save_progress_json(progress):
-    with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(progress, f, indent=2, ensure_ascii=False)
-
-def load_progress():
-    return load_progress_json()
-
-def save_progress(word_id, wp, is_correct):
-    progress = load_progress_json()
-    progress['word_progress'][word_id] = wp
-    progress['user_stats']['total_practiced'] += 1
-    if is_correct:
-        progress['user_stats']['total_correct'] += 1
-    progress['user_stats']['last_session'] = datetime.now().isoformat()
-    save_progress_json(progress)
-
-def reset_all_progress():
-    if os.path.exists(PROGRESS_FILE):
-        os.remove(PROGRESS_FILE)
+    return get_catalog().words
+
+# Progress lives in per-user SQLite shards; an existing user_progress.json is
+# migrated on first start and goes to the first browser that shows up
+# without a user id (the old app's only learner). Changes are written
+# behind by a background thread at most PROGRESS_FLUSH_INTERVAL seconds late.
+progress_store = ProgressStore(PROGRESS_DIR, legacy_json=PROGRESS_FILE)
+user_states = UserStateCache(progress_store, flush_interval=float(os.environ.get('PROGRESS_FLUSH_INTERVAL', '2.0')))
+atexit.register(user_states.close)
+review_sessions = ReviewSessionStore(progress_store)
+answer_log = AnswerLog(ANSWER_LOG_DIR)
+atexit.register(answer_log.flush)
+answer_stats = AnswerStats(answer_log)
+
+def known_user_id():
+    """The learner's id from the X-User-Id header or cookie, or None; never issues one."""
+    user_id = request.headers.get('X-User-Id') or request.cookies.get(USER_COOKIE)
+    return user_id if user_id and VALID_USER_ID.fullmatch(user_id) else None
+
+def current_user_id():
+    """Identify the learner by X-User-Id header or cookie, issuing a new id if needed."""
+    if 'user_id' not in g:
+        user_id = known_user_id()
+        if user_id is None:
+            user_id = progress_store.claim_legacy_user() or secrets.token_urlsafe(16)
+            g.new_user_id = user_id
+        g.user_id = user_id
+    return g.user_id
+
+@app.after_request
+def remember_user(response):
+    if 'new_user_id' in g:
+        response.set_cookie(USER_COOKIE, g.new_user_id, max_age=USER_COOKIE_MAX_AGE, httponly=True, samesite='Lax')
+    return response
+
+def current_deck():
+    """The deck this request is for: 'deck' in the query string or JSON body, else the learner's setting."""
+    if 'deck' not in g:
+        data = request.get_json(silent=True) if request.is_json else None
+        deck = request.args.get('deck') or (data.get('deck') if isinstance(data, dict) else None)
+        if not deck:
+            # Only a learner who already has an id can have picked a deck; don't issue one here
+            user_id = known_user_id()
+            deck = user_states.setting(user_id, 'deck', DEFAULT_DECK) if user_id else DEFAULT_DECK
+            if not isinstance(deck, str) or not decks.exists(deck):
+                # The deck the learner picked has since been removed
+                deck = DEFAULT_DECK
+        elif not isinstance(deck, str) or not decks.exists(deck):
+            raise UnknownDeck(deck)
+        g.deck = deck
+    return g.deck
+
+def learner_id(user_id, deck=DEFAULT_DECK, direction=FORWARD):
+    if deck != DEFAULT_DECK:
+        user_id += DECK_USER_PREFIX + deck
+    if direction == REVERSE:
+        user_id += REVERSE_USER_SUFFIX
+    return user_id
+
+def settings_state():
+    """The learner's own state, which holds the settings for every deck and direction."""
+    return user_states.get(current_user_id())
+
+def get_user_state(user_id=None, direction=FORWARD):
+    return user_states.get(learner_id(user_id or current_user_id(), current_deck(), direction))
+
+def requested_direction(data=None):
+    """The 'direction' from a JSON body or the query string (None if invalid)."""
+    direction = (data if data is not None else request.args).get('direction', FORWARD)
+    return direction if direction in DIRECTIONS else None
+
+def selection_index(state, current, direction):
+    """The state's learner index; every deck and direction follows the learner's own scheduling setting."""
+    return state.learner_index(current, settings_state().settings.get('scheduling'))
+
+def load_progress(user_id=None):
+    return get_user_state(user_id).progress
+
+def save_progress(word_id, wp, is_correct, user_id=None):
+    user_states.record_answer(get_user_state(user_id), word_id, wp, is_correct)
+
+def reset_all_progress(user_id=None):
+    user_id = user_id or current_user_id()
+    for direction in DIRECTIONS:
+        user_states.reset(learner_id(user_id, current_deck(), direction))
 
 def is_mastered(word_progress):
     """Check if a word is mastered based on the mastery rules."""
@@ -72,143 +165,207 @@ def is_mastered(word_progress):
         return True
     return False
 
-def normalize_answer(answer):
-    """Normalize answer for comparison."""
-    return answer.strip().lower()
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe(
+            'fq_http_request_duration_seconds',
+            time.perf_counter() - started,
+            (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))),
+        )
+        if not response.is_streamed:
+            metrics.observe('fq_http_response_size_bytes', response.content_length or 0, (('endpoint', endpoint),))
+        metrics.maybe_dump()
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus scrape endpoint, aggregated over all workers sharing METRICS_DIR."""
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
 
-def remove_accents(text):
-    """Remove accent marks from text for loose comparison."""
-    nfkd = unicodedata.normalize('NFKD', text)
-    return ''.join(c for c in nfkd if not unicodedata.combining(c))
+@app.route('/')
+def index():
+    return render_template('index.html')
 
-def build_article_answers(correct_answers, article):
-    """Return correct answers prefixed with the required article."""
-    return [f"{article} {ans}" for ans in correct_answers]
+MAX_PLANNED_WORDS = 50
 
-def check_answer_match(user_answer, correct_answers, strictness='high', word=None):
-    """Check if user's answer matches any correct answer.
+def card_payloads(current, direction=FORWARD):
+    if direction == REVERSE:
+        return current.derived('reverse_cards', lambda c: CardPayloads(c, reverse_listing))
+    return current.derived('cards', CardPayloads)
 
-    Returns a dict: {'correct': bool, 'accent_only_miss': bool, 'article_miss': bool}.
-    accent_only_miss is True when the answer would be correct if accents are ignored.
-    article_miss is True when the noun answer is correct but the article was missing/wrong.
-    """
-    normalized_user = normalize_answer(user_answer)
+def json_response(body):
+    """A response for an already encoded JSON body."""
+    return app.response_class(body, mimetype='application/json')
 
-    # For high strictness on nouns: require correct article prefix
-    if strictness == 'high' and word and word.get('category') == 'noun' and word.get('article'):
-        article = word['article']
-        article_answers = build_article_answers(correct_answers, article)
+def cards_response(current, word_ids, direction, fields):
+    """`fields` plus 'word' (the first card) and 'words', spliced in from the pre-encoded cards."""
+    encoded = card_payloads(current, direction).encoded
+    cards = [encoded[word_id] for word_id in word_ids]
+    return json_response(b''.join((
+        encode_json(fields)[:-1], b',"word":', cards[0], b',"words":[', b','.join(cards), b']}',
+    )))
 
-        for correct in article_answers:
-            if normalize_answer(correct) == normalized_user:
-                return {'correct': True, 'accent_only_miss': False, 'article_miss': False}
+def requested_count():
+    """The 'count' query parameter, clamped to 1..MAX_PLANNED_WORDS (None if invalid)."""
+    count = request.args.get('count', 1, type=int)
+    if count is None or count < 1:
+        return None
+    return min(count, MAX_PLANNED_WORDS)
 
-        # Check if they got the noun right but forgot the article
-        for correct in correct_answers:
-            if normalize_answer(correct) == normalized_user:
-                return {'correct': False, 'accent_only_miss': False, 'article_miss': True}
-
-        return {'correct': False, 'accent_only_miss': False, 'article_miss': False}
+@app.route('/api/next-word')
+def get_next_word():
+    """Return the next word, plus the planned words after it when 'count' > 1.
 
-    # Medium and low strictness: standard matching without article requirement
-    for correct in correct_answers:
-        if normalize_answer(correct) == normalized_user:
-            return {'correct': True, 'accent_only_miss': False, 'article_miss': False}
+    'words' holds up to 'count' upcoming words chosen by the same selection
+    policy, so a client can prefetch them; 'word' is always the first.
+    'direction=reverse' picks from the Spanish -> English progress instead.
+    """
+    count = requested_count()
+    if count is None:
+        return jsonify({'error': 'count must be a positive integer'}), 400
+    direction = requested_direction()
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    current = get_catalog()
+    state = get_user_state(direction=direction)
+    with state.lock:
+        word_ids = selection_index(state, current, direction).plan(count)
 
-    if strictness == 'low':
-        user_no_accents = remove_accents(normalized_user)
-        for correct in correct_answers:
-            if remove_accents(normalize_answer(correct)) == user_no_accents:
-                return {'correct': True, 'accent_only_miss': True, 'article_miss': False}
+    # If no unmastered words remain, we're done
+    if not word_ids:
+        return jsonify({'done': True, 'message': 'All words mastered!'})
 
-    return {'correct': False, 'accent_only_miss': False, 'article_miss': False}
+    return cards_response(current, word_ids, direction, {'done': False})
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+def words_payload_name(level, direction):
+    name = 'words_payload' if direction == FORWARD else 'reverse_words_payload'
+    return name if level is None else f'{name}:{level}'
 
-@app.route('/api/next-word')
-def get_next_word():
-    words = load_words()
-    progress = load_progress()
-    word_progress = progress['word_progress']
-
-    # Separate words into categories:
-    # - active: shown at least once but not mastered (randomly select from these)
-    # - new: never shown (introduce by frequency rank when no active words)
-    # - review: mastered words that were initially gotten wrong (5% chance to review)
-
-    active_words = []
-    new_words = []
-    review_words = []
-
-    for word in words:
-        word_id = str(word['id'])
-        wp = word_progress.get(word_id, {})
-
-        if wp.get('mastered', False):
-            # Mastered word - check if it was initially gotten wrong for review pool
-            if wp.get('first_attempt_correct') is False:
-                review_words.append(word)
-            continue
+def build_direction_payload(current, level, direction):
+    if direction == REVERSE:
+        return build_words_payload(current, level, reverse_listing)
+    return build_words_payload(current, level)
 
-        times_shown = wp.get('times_shown', 0)
+WORDS_CACHE_CONTROL = 'public, max-age=3600, stale-while-revalidate=86400'
+WORDS_PRIVATE_CACHE_CONTROL = 'private, max-age=3600'
 
-        if times_shown > 0:
-            # Word has been shown but not mastered - add to active pool
-            active_words.append(word)
-        else:
-            # New word - track for introduction by frequency
-            new_words.append(word)
+def negotiate_encoding(payload):
+    """Pick the best precompressed variant the client accepts (None = identity)."""
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in payload.encoded and accepted[encoding] > 0:
+            return encoding
+    return None
 
-    # If no unmastered words remain, we're done
-    if not active_words and not new_words:
-        return jsonify({'done': True, 'message': 'All words mastered!'})
+@app.route('/api/words')
+def get_all_words():
+    """Return the word list, optionally limited to one 1,000-rank level.
 
-    # Selection logic:
-    # 5% chance to review a mastered word that was initially gotten wrong
-    # 80% new word by frequency rank, 20% random active word (if both available)
-    if review_words and random.random() < 0.05:
-        selected = random.choice(review_words)
-    elif active_words and new_words:
-        if random.random() < 0.2:
-            selected = random.choice(active_words)
-        else:
-            new_words.sort(key=lambda x: x['rank'])
-            selected = new_words[0]
-    elif active_words:
-        selected = random.choice(active_words)
+    The body is serialized and compressed once per catalog version and
+    served with a strong ETag so repeat visits get a 304. With
+    'direction=reverse' each word carries its Spanish 'prompt' instead.
+    """
+    current = get_catalog()
+    level = request.args.get('level', type=int)
+    direction = requested_direction()
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    if level is not None and not 1 <= level <= max_level(current):
+        return jsonify({'error': 'Invalid level'}), 400
+    payload = current.derived(words_payload_name(level, direction), lambda c: build_direction_payload(c, level, direction))
+
+    encoding = negotiate_encoding(payload)
+    if any(etag in request.if_none_match for etag in payload.variant_etags()):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(payload.body(encoding), mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(payload.variant_etag(encoding))
+    if 'deck' in request.args:
+        response.headers['Cache-Control'] = WORDS_CACHE_CONTROL
     else:
-        # Sort new words by rank and pick the most common (lowest rank)
-        new_words.sort(key=lambda x: x['rank'])
-        selected = new_words[0]
+        # Without 'deck' the body follows the learner's deck setting
+        response.headers['Cache-Control'] = WORDS_PRIVATE_CACHE_CONTROL
+        response.vary.update(('Cookie', 'X-User-Id'))
+    response.vary.add('Accept-Encoding')
+    return response
 
-    return jsonify({
-        'done': False,
-        'word': {
-            'id': selected['id'],
-            'english': selected['english'],
-            'category': selected['category'],
-            'hint': selected.get('hint', ''),
-            'rank': selected['rank'],
-            'article': selected.get('article'),
-        }
-    })
+MAX_SEARCH_RESULTS = 50
 
-@app.route('/api/words')
-def get_all_words():
-    words = load_words()
-    return jsonify({'words': [
-        {
-            'id': w['id'],
-            'english': w['english'],
-            'rank': w['rank'],
-            'category': w['category'],
-            'hint': w.get('hint', ''),
-            'article': w.get('article'),
-        }
-        for w in words
-    ]})
+@app.route('/api/search')
+@metrics.timed('search')
+def search_words():
+    """Words whose English glosses or Spanish forms start with 'q', best rank first.
+
+    Matching ignores case and accents; 'limit' caps the results (default 10).
+    """
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+    if limit is None or not 1 <= limit <= MAX_SEARCH_RESULTS:
+        return jsonify({'error': f'limit must be between 1 and {MAX_SEARCH_RESULTS}'}), 400
+    current = get_catalog()
+    word_ids = current.derived('search', build_search_index).search(query, limit)
+    results = []
+    cards = card_payloads(current).cards
+    for word_id in word_ids:
+        results.append(dict(cards[word_id], spanish=list(current.get(word_id)['spanish'])))
+    return jsonify({'query': query, 'results': results})
+
+MAX_BATCH_ANSWERS = 500
+# Far longer than any accepted answer; longer ones are rejected before grading
+MAX_ANSWER_LENGTH = 200
+
+def verdict_label(result):
+    if result['accent_only_miss']:
+        return 'accent_only_miss'
+    if result['correct']:
+        return 'correct'
+    if result['article_miss']:
+        return 'article_miss'
+    if result['near_miss']:
+        return 'near_miss'
+    return 'incorrect'
+
+@metrics.timed('check_answer')
+def judge_answer(current, word_id, user_answer, strictness, direction=FORWARD):
+    """The verdict flags for one answer. Returns None if the word is unknown."""
+    if not current.get(word_id):
+        return None
+
+    if direction == REVERSE:
+        result = current.derived('reverse', build_reverse_index).match(word_id, user_answer)
+        metrics.inc('fq_answer_verdicts_total', (('verdict', verdict_label(result)), ('strictness', 'reverse')))
+        # Not written to the answer log, whose analytics are for the Spanish answers
+        return result
+
+    answer_index = current.derived('answers', build_answer_index)
+    near_misses = current.derived('near_misses', build_near_miss_index)
+    result = answer_index[word_id].match(user_answer, strictness, near_misses)
+    verdict = verdict_label(result)
+    metrics.inc('fq_answer_verdicts_total', (('verdict', verdict), ('strictness', strictness_label(strictness))))
+    if current is catalog:
+        # The log has no deck column; its analytics cover the default deck
+        answer_log.append(current_user_id(), word_id, verdict, result['correct'], strictness)
+    return result
+
+def answer_payloads(current):
+    return current.derived('answer_payloads', AnswerPayloads)
+
+def grade_answer(current, word_id, user_answer, strictness, direction=FORWARD):
+    """Grade one answer against the catalog. Returns None if the word is unknown."""
+    result = judge_answer(current, word_id, user_answer, strictness, direction)
+    if result is None:
+        return None
+    valid_answers, article, _ = answer_payloads(current).reveal(word_id, strictness, direction == REVERSE)
+    return dict(result, valid_answers=valid_answers, article=article)
 
 @app.route('/api/check-answer', methods=['POST'])
 def check_user_answer():
@@ -216,119 +373,365 @@ def check_user_answer():
     word_id = str(data.get('word_id'))
     user_answer = data.get('answer', '')
     strictness = data.get('strictness', 'high')
-
-    words = load_words()
-
-    # Find the word
-    word = next((w for w in words if str(w['id']) == word_id), None)
-    if not word:
+    direction = requested_direction(data)
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    if not isinstance(user_answer, str) or len(user_answer) > MAX_ANSWER_LENGTH:
+        return jsonify({'error': f'answer must be a string of at most {MAX_ANSWER_LENGTH} characters'}), 400
+
+    current = get_catalog()
+    result = judge_answer(current, word_id, user_answer, strictness, direction)
+    if result is None:
         return jsonify({'error': 'Word not found'}), 404
+    _, _, revealed = answer_payloads(current).reveal(word_id, strictness, direction == REVERSE)
+    return json_response(b''.join((encode_json(result)[:-1], b',', revealed, b'}')))
 
-    result = check_answer_match(user_answer, word['spanish'], strictness, word)
+@app.route('/api/check-answers', methods=['POST'])
+def check_user_answers():
+    """Grade a batch of queued answers in one request.
 
-    valid_answers = word['spanish']
-    if strictness == 'high' and word.get('category') == 'noun' and word.get('article'):
-        valid_answers = build_article_answers(word['spanish'], word['article'])
+    Expects {'answers': [{'word_id', 'answer', 'strictness'}, ...]} and returns
+    {'results': [...]} in the same order, each shaped like /api/check-answer.
+    Unknown words get an 'error' entry instead of failing the whole batch.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    answers = data.get('answers')
+    if not isinstance(answers, list):
+        return jsonify({'error': 'answers must be a list'}), 400
+    if len(answers) > MAX_BATCH_ANSWERS:
+        return jsonify({'error': f'At most {MAX_BATCH_ANSWERS} answers per batch'}), 413
+
+    current = get_catalog()
+    results = []
+    for item in answers:
+        if (not isinstance(item, dict) or not isinstance(item.get('answer', ''), str)
+                or len(item.get('answer', '')) > MAX_ANSWER_LENGTH):
+            results.append({'error': 'Invalid answer'})
+            continue
+        direction = requested_direction(item)
+        if direction is None:
+            results.append({'word_id': item.get('word_id'), 'error': 'Invalid direction'})
+            continue
+        word_id = str(item.get('word_id'))
+        graded = grade_answer(current, word_id, item.get('answer', ''), item.get('strictness', 'high'), direction)
+        if graded is None:
+            results.append({'word_id': item.get('word_id'), 'error': 'Word not found'})
+            continue
+        graded['word_id'] = item.get('word_id')
+        results.append(graded)
 
-    return jsonify({
-        'correct': result['correct'],
-        'accent_only_miss': result['accent_only_miss'],
-        'article_miss': result['article_miss'],
-        'valid_answers': valid_answers,
-        'article': word.get('article'),
-    })
+    return jsonify({'results': results})
 
 @app.route('/api/active-words')
 def get_active_words():
     """Return count of active words (shown but not mastered)."""
-    words = load_words()
-    progress = load_progress()
-    word_progress = progress['word_progress']
+    direction = requested_direction()
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    state = get_user_state(direction=direction)
+    with state.lock:
+        count = selection_index(state, get_catalog(), direction).counters.totals['active']
+    return jsonify({'active_count': count})
+
+def review_word_response(state, current, session_id, count=1, direction=FORWARD):
+    """Hand out the next `count` words of a stored review session, or None if it is gone."""
+    with state.lock:
+        index = selection_index(state, current, direction)
+        taken = review_sessions.next_word_ids(
+            session_id, state.user_id, count, lambda w: index.states.get(w) == ACTIVE)
+    if taken is None:
+        return None
+    remaining, word_ids = taken
+
+    if not word_ids:
+        review_sessions.discard(session_id, state.user_id)
+        return jsonify({'done': True, 'message': 'No active words to review!'})
 
-    count = 0
-    for word in words:
-        word_id = str(word['id'])
-        wp = word_progress.get(word_id, {})
-        if not wp.get('mastered', False) and wp.get('times_shown', 0) > 0:
-            count += 1
+    return cards_response(current, word_ids, direction, {
+        'done': False,
+        'session_id': session_id,
+        'remaining': remaining,
+    })
 
-    return jsonify({'active_count': count})
+def start_review_session(state, current, direction=FORWARD):
+    with state.lock:
+        active = selection_index(state, current, direction).active.items
+        return review_sessions.create(state.user_id, active)
+
+@app.route('/api/review-sessions', methods=['POST'])
+def create_review_session():
+    """Start a review session over the learner's current active words."""
+    direction = requested_direction()
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    session = start_review_session(get_user_state(direction=direction), get_catalog(), direction)
+    return jsonify({
+        'session_id': session.session_id,
+        'remaining': session.remaining,
+        'expires_in': review_sessions.ttl,
+    })
+
+@app.route('/api/review-sessions/<session_id>/next')
+def get_review_session_word(session_id):
+    direction = requested_direction()
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    count = requested_count()
+    if count is None:
+        return jsonify({'error': 'count must be a positive integer'}), 400
+    response = review_word_response(get_user_state(direction=direction), get_catalog(), session_id, count, direction)
+    if response is None:
+        return jsonify({'error': 'Review session not found or expired'}), 404
+    return response
+
+def legacy_review_word(state, current, excluded_ids, count=1, direction=FORWARD):
+    with state.lock:
+        active = selection_index(state, current, direction).active.items
+        active_ids = [w for w in active if w not in excluded_ids]
+
+    if not active_ids:
+        return jsonify({'done': True, 'message': 'No active words to review!'})
+
+    picked = random.sample(active_ids, min(count, len(active_ids)))
+    return cards_response(current, picked, direction, {'done': False, 'remaining': len(active_ids)})
 
 @app.route('/api/next-review-word')
 def get_next_review_word():
     """Return a random active word for review mode.
 
-    Accepts an optional 'exclude' query parameter with comma-separated
-    word IDs to exclude (words already reviewed this session).
+    Pass the 'session' id from the previous response to keep going through
+    the same review session; without one a new session is started. The old
+    comma-separated 'exclude' parameter is still honoured for older clients.
+    'count' hands out that many session words at once, as in /api/next-word.
     """
-    words = load_words()
-    progress = load_progress()
-    word_progress = progress['word_progress']
+    count = requested_count()
+    if count is None:
+        return jsonify({'error': 'count must be a positive integer'}), 400
+    direction = requested_direction()
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    current = get_catalog()
+    state = get_user_state(direction=direction)
 
     exclude_param = request.args.get('exclude', '')
-    excluded_ids = set(exclude_param.split(',')) if exclude_param else set()
+    if exclude_param:
+        return legacy_review_word(state, current, set(exclude_param.split(',')), count, direction)
 
-    active_words = []
-    for word in words:
-        word_id = str(word['id'])
-        wp = word_progress.get(word_id, {})
-        if not wp.get('mastered', False) and wp.get('times_shown', 0) > 0:
-            if word_id not in excluded_ids:
-                active_words.append(word)
+    session_id = request.args.get('session')
+    response = review_word_response(state, current, session_id, count, direction) if session_id else None
+    if response is None:
+        session = start_review_session(state, current, direction)
+        response = review_word_response(state, current, session.session_id, count, direction)
+    return response
 
-    if not active_words:
-        return jsonify({'done': True, 'message': 'No active words to review!'})
-
-    selected = random.choice(active_words)
+@app.route('/api/progress')
+def get_progress():
+    """Progress summary; mastered/active/unseen counts come from maintained counters.
 
+    'level' (1,000-rank level) or 'category' narrows the counts to that
+    slice; 'breakdown=1' adds the counts for every level and category.
+    'direction=reverse' reports the Spanish -> English progress.
+    """
+    direction = requested_direction()
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    current = get_catalog()
+    state = get_user_state(direction=direction)
+    progress = state.progress
+    level = request.args.get('level', type=int)
+    category = request.args.get('category')
+
+    with state.lock:
+        counters = selection_index(state, current, direction).counters
+        if level is not None:
+            counts = dict(counters.by_level.get(level, empty_counts()))
+        elif category is not None:
+            counts = dict(counters.by_category.get(category, empty_counts()))
+        else:
+            counts = dict(counters.totals)
+        breakdown = None
+        if request.args.get('breakdown') == '1':
+            breakdown = {
+                'levels': {str(k): dict(v) for k, v in counters.by_level.items()},
+                'categories': {k: dict(v) for k, v in counters.by_category.items()},
+            }
+        stats = dict(progress['user_stats'])
+
+    response = {
+        'total_words': sum(counts.values()),
+        'mastered': counts['mastered'],
+        'active': counts['active'],
+        'unseen': counts['unseen'],
+        'total_practiced': stats['total_practiced'],
+        'total_correct': stats['total_correct'],
+        'accuracy': round(stats['total_correct'] / max(1, stats['total_practiced']) * 100, 1),
+        'session_count': stats['session_count'],
+        'last_session': stats['last_session']
+    }
+    if breakdown is not None:
+        response['breakdown'] = breakdown
+    return jsonify(response)
+
+@app.route('/api/admin/check-counters')
+def check_counters():
+    """Rebuild the requesting learner's progress counters from scratch and compare (admin only)."""
+    if not is_admin():
+        return jsonify({'error': 'Forbidden'}), 403
+    direction = requested_direction()
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    state = get_user_state(direction=direction)
+    with state.lock:
+        mismatches = selection_index(state, get_catalog(), direction).check_counters(state.word_progress)
     return jsonify({
-        'done': False,
-        'word': {
-            'id': selected['id'],
-            'english': selected['english'],
-            'category': selected['category'],
-            'hint': selected.get('hint', ''),
-            'rank': selected['rank'],
-            'article': selected.get('article'),
-        },
-        'remaining': len(active_words)
+        'consistent': not mismatches,
+        'mismatches': [
+            {'scope': scope, 'key': key, 'maintained': kept, 'rebuilt': rebuilt}
+            for scope, key, kept, rebuilt in mismatches
+        ],
     })
 
-@app.route('/api/progress')
-def get_progress():
-    words = load_words()
-    progress = load_progress()
+MAX_SYNC_WORDS = 5000
 
-    total_words = len(words)
-    mastered_count = sum(1 for wp in progress['word_progress'].values() if wp.get('mastered', False))
+@app.route('/api/sync', methods=['POST'])
+def sync_progress():
+    """Exchange word progress changes with one device.
 
+    Expects {'since': revision, 'changes': {word_id: record}, 'practiced': n,
+    'correct': n} holding only what the device changed since its last
+    sync, and returns {'version', 'changes', 'user_stats', 'reset'} with
+    only the records it does not have yet. Records carry an 'updated_at'
+    timestamp and the newer one wins. Each direction syncs separately.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    since = data.get('since', 0)
+    changes = data.get('changes', {})
+    practiced = data.get('practiced', 0)
+    correct = data.get('correct', 0)
+    direction = requested_direction(data)
+    if direction is None:
+        return jsonify({'error': 'Invalid direction'}), 400
+    if not isinstance(changes, dict) or not all(valid_record(v) for v in changes.values()):
+        return jsonify({'error': 'changes must map word ids to records of known fields and types'}), 400
+    if not all(type(n) is int and n >= 0 for n in (since, practiced, correct)) or correct > practiced:
+        return jsonify({'error': 'since, practiced and correct must be non-negative integers'}), 400
+    if len(changes) > MAX_SYNC_WORDS:
+        return jsonify({'error': f'At most {MAX_SYNC_WORDS} changed words per sync'}), 413
+
+    current = get_catalog()
+    words = {str(word_id): record for word_id, record in changes.items() if current.get(word_id)}
+    result = user_states.sync(get_user_state(direction=direction), since, words, practiced, correct)
     return jsonify({
-        'total_words': total_words,
-        'mastered': mastered_count,
-        'total_practiced': progress['user_stats']['total_practiced'],
-        'total_correct': progress['user_stats']['total_correct'],
-        'accuracy': round(progress['user_stats']['total_correct'] / max(1, progress['user_stats']['total_practiced']) * 100, 1),
-        'session_count': progress['user_stats']['session_count'],
-        'last_session': progress['user_stats']['last_session']
+        'version': result['revision'],
+        'changes': result['changes'],
+        'user_stats': result['user_stats'],
+        'reset': result['reset'],
     })
 
 @app.route('/api/settings', methods=['GET', 'POST'])
 def handle_settings():
-    progress = load_progress_json()
+    state = settings_state()
     if request.method == 'POST':
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'settings must be a JSON object'}), 400
+        changes = {}
         if 'strictness' in data and data['strictness'] in ('low', 'medium', 'high'):
-            progress['settings']['strictness'] = data['strictness']
+            changes['strictness'] = data['strictness']
         valid_themes = ('default', 'spain', 'mexico', 'costa-rica', 'colombia', 'dominican-republic')
         if 'theme' in data and data['theme'] in valid_themes:
-            progress['settings']['theme'] = data['theme']
-        save_progress_json(progress)
-    return jsonify(progress['settings'])
+            changes['theme'] = data['theme']
+        if 'scheduling' in data and data['scheduling'] in SCHEDULING_MODES:
+            changes['scheduling'] = data['scheduling']
+        if isinstance(data.get('deck'), str) and decks.exists(data['deck']):
+            changes['deck'] = data['deck']
+        if changes:
+            user_states.update_settings(state, changes)
+    return jsonify(state.settings)
+
+def is_admin():
+    token = os.environ.get('ADMIN_TOKEN')
+    return bool(token) and request.headers.get('X-Admin-Token') == token
+
+@app.errorhandler(UnknownDeck)
+def unknown_deck(error):
+    return jsonify({'error': f'Unknown deck: {error.args[0]}'}), 404
+
+@app.route('/api/decks')
+def list_decks():
+    """The decks that can be picked with 'deck' (per request) or the 'deck' setting.
+
+    Admins also get the decks resident in this worker, least recently used
+    first, with their estimated memory against the DECK_CACHE_MB budget.
+    """
+    response = {'decks': decks.names(), 'default': DEFAULT_DECK, 'selected': current_deck()}
+    if is_admin():
+        response['cache'] = {
+            'resident': [{'deck': name, 'bytes': size} for name, size in decks.loaded()],
+            'resident_bytes': decks.resident_bytes,
+            'max_bytes': decks.max_bytes,
+            'loads': decks.loads,
+            'evictions': decks.evictions,
+        }
+    return jsonify(response)
+
+@app.route('/api/admin/reload-words', methods=['POST'])
+def reload_words():
+    """Force the requested deck's word catalog to be re-read from disk.
+
+    Only available when ADMIN_TOKEN is set and sent as X-Admin-Token.
+    """
+    if not is_admin():
+        return jsonify({'error': 'Forbidden'}), 403
+    reloaded = get_catalog().reload()
+    return jsonify({'success': True, 'version': reloaded.version, 'total_words': len(reloaded.words)})
+
+@app.route('/api/admin/analytics')
+@metrics.timed('analytics')
+def get_analytics():
+    """Accuracy and time-to-mastery over every logged answer, across all learners.
+
+    Grouped by category, 1,000-word level and strictness. Admin only, like
+    reload-words.
+    """
+    if not is_admin():
+        return jsonify({'error': 'Forbidden'}), 403
+    current = get_catalog(DEFAULT_DECK)
+    return jsonify(answer_stats.report(current.derived('word_lookup', build_word_lookup)))
 
 @app.route('/api/reset', methods=['POST'])
 def reset_progress():
     reset_all_progress()
     return jsonify({'success': True, 'message': 'Progress reset successfully'})
 
+def warm_up():
+    """Load the default deck and build every derived index now instead of on first use."""
+    current = get_catalog(DEFAULT_DECK)
+    current.derived('answers', build_answer_index)
+    current.derived('near_misses', build_near_miss_index)
+    current.derived('word_lookup', build_word_lookup)
+    current.derived('reverse', build_reverse_index)
+    current.derived('search', build_search_index)
+    answer_payloads(current)
+    for direction in DIRECTIONS:
+        card_payloads(current, direction)
+    for direction in DIRECTIONS:
+        for level in [None, *range(1, max_level(current) + 1)]:
+            current.derived(words_payload_name(level, direction), lambda c: build_direction_payload(c, level, direction))
+
+def create_app():
+    """Production entry point: a fully warmed app, meant to be preloaded (see gunicorn.conf.py)."""
+    warm_up()
+    return app
+
+def init_worker():
+    """Per-process setup after a fork from a preloaded master."""
+    # Timings recorded while warming up belong to the master, not to every worker
+    metrics.reset()
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
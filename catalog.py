@@ -0,0 +1,89 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+from compact_catalog import compact_path_for, open_compact, source_digest
+
+# Versions are unique across every catalog in the process, so a structure
+# keyed by version can't mistake one deck, or a reloaded copy, for another
+_versions = itertools.count(1)
+
+
+class WordCatalog:
+    """Process-wide word list, loaded once and indexed by id and rank.
+
+    The backing file is only re-read when its mtime or size changes (checked
+    at most every `check_interval` seconds) or when reload() is called.
+    If a compiled words.bin built from the same words.json sits next to it
+    (see scripts/build_catalog.py) the words are served from that mmap
+    instead of being parsed into dicts.
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.compact_path = compact_path_for(path)
+        self.compact = None
+        self.check_interval = check_interval
+        self.words = []
+        self.by_id = {}
+        self.by_rank = {}
+        self.version = 0
+        self._stamp = None
+        self._checked_at = 0.0
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        try:
+            compact = os.stat(self.compact_path)
+            compact = (compact.st_mtime_ns, compact.st_size)
+        except OSError:
+            compact = None
+        return (st.st_mtime_ns, st.st_size, compact)
+
+    def refresh(self):
+        """Reload the catalog if the file changed since it was last read."""
+        now = time.monotonic()
+        if self._stamp is not None and now - self._checked_at < self.check_interval:
+            return self
+        self._checked_at = now
+        if self._file_stamp() != self._stamp:
+            self.reload()
+        return self
+
+    def reload(self):
+        """Unconditionally re-read the file and rebuild the indexes."""
+        with self._lock:
+            stamp = self._file_stamp()
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            compact = open_compact(self.compact_path, source_digest(raw))
+            if compact is not None:
+                words, by_id, by_rank = compact.words, compact.by_id, compact.by_rank
+            else:
+                words = json.loads(raw)['words']
+                by_id = {str(w['id']): w for w in words}
+                by_rank = {w['rank']: w for w in words}
+            # Swap everything in one go so readers never see a half-built index
+            self.words = words
+            self.by_id = by_id
+            self.by_rank = by_rank
+            self.compact = compact
+            self._derived = {}
+            self._stamp = stamp
+            self._checked_at = time.monotonic()
+            self.version = next(_versions)
+        return self
+
+    def get(self, word_id):
+        return self.by_id.get(str(word_id))
+
+    def derived(self, name, build):
+        """Return a structure computed from the current words, built once per version."""
+        derived = self._derived
+        if name not in derived:
+            derived[name] = build(self)
+        return derived[name]
@@ -0,0 +1,320 @@
+"""Compact, memory-mappable word catalog format.
+
+words.json is compiled (by scripts/build_catalog.py) into a single file of
+little-endian fixed-width arrays plus a deduplicated UTF-8 string table:
+
+    header   magic, counts, sha256 of the source words.json, section offsets
+    ids, ranks                  int32[n]
+    categories                  uint16[n]   index into the category table
+    english, hint, article      uint32[n]   string ids (NONE = null)
+    extras                      uint32[n]   string id of a JSON object of any other keys
+    shapes                      uint16[n]   index into the shape table (key order)
+    spanish_start               uint32[n+1] slice of spanish_refs for each word
+    spanish_refs                uint32[*]   string ids
+    sorted_ids, id_order        int32[n], uint32[n]   lookup by id
+    sorted_ranks, rank_order    int32[n], uint32[n]   lookup by rank
+    category_table, shape_table uint32[*]   string ids
+    string_offsets              uint32[m+1]
+    string_blob                 bytes
+
+The file is opened with mmap and read through memoryviews, so gunicorn
+workers share the pages and nothing is decoded until a field is read.
+"""
+
+import bisect
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import ItemsView, Mapping, Sequence, ValuesView
+
+MAGIC = b'FQCAT\x00\x00\x01'
+NONE = 0xFFFFFFFF
+REQUIRED_KEYS = ('id', 'english', 'spanish', 'rank', 'category')
+KNOWN_KEYS = REQUIRED_KEYS + ('hint', 'article')
+
+SECTIONS = (
+    ('ids', 'i'),
+    ('ranks', 'i'),
+    ('categories', 'H'),
+    ('english', 'I'),
+    ('hint', 'I'),
+    ('article', 'I'),
+    ('extras', 'I'),
+    ('shapes', 'H'),
+    ('spanish_start', 'I'),
+    ('spanish_refs', 'I'),
+    ('sorted_ids', 'i'),
+    ('id_order', 'I'),
+    ('sorted_ranks', 'i'),
+    ('rank_order', 'I'),
+    ('category_table', 'I'),
+    ('shape_table', 'I'),
+    ('string_offsets', 'I'),
+    ('string_blob', 'B'),
+)
+HEADER = struct.Struct('<8sI32s' + 'II' * len(SECTIONS))
+
+
+def compact_path_for(words_path):
+    return words_path.rsplit('.', 1)[0] + '.bin'
+
+
+# --- Writing ---
+
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def add(self, value):
+        if value is None:
+            return NONE
+        if not isinstance(value, str):
+            raise ValueError(f"expected a string, got {value!r}")
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return sid
+
+
+def _int32(value, what):
+    if type(value) is not int or not -2**31 <= value < 2**31:
+        raise ValueError(f"{what} must be a 32-bit integer, got {value!r}")
+    return value
+
+
+def compile_words(words, source_sha256):
+    """Encode a words list into the compact format. Raises ValueError if it can't."""
+    strings = _StringTable()
+    categories = {}
+    shapes = {}
+    cols = {name: array(code) for name, code in SECTIONS}
+
+    for word in words:
+        keys = tuple(word)
+        missing = set(REQUIRED_KEYS) - set(keys)
+        if missing:
+            raise ValueError(f"word {word.get('id')!r} is missing {sorted(missing)}")
+        cols['ids'].append(_int32(word['id'], 'id'))
+        cols['ranks'].append(_int32(word['rank'], 'rank'))
+        cols['categories'].append(categories.setdefault(strings.add(word['category']), len(categories)))
+        cols['english'].append(strings.add(word['english']))
+        cols['hint'].append(strings.add(word['hint']) if 'hint' in word else NONE)
+        cols['article'].append(strings.add(word['article']) if 'article' in word else NONE)
+        extras = {k: word[k] for k in keys if k not in KNOWN_KEYS}
+        cols['extras'].append(strings.add(json.dumps(extras, ensure_ascii=False)) if extras else NONE)
+        cols['shapes'].append(shapes.setdefault(strings.add(json.dumps(keys)), len(shapes)))
+        if not isinstance(word['spanish'], list):
+            raise ValueError(f"word {word['id']} has a non-list 'spanish'")
+        cols['spanish_start'].append(len(cols['spanish_refs']))
+        cols['spanish_refs'].extend(strings.add(s) for s in word['spanish'])
+    cols['spanish_start'].append(len(cols['spanish_refs']))
+
+    for values, sorted_name, order_name in (('ids', 'sorted_ids', 'id_order'), ('ranks', 'sorted_ranks', 'rank_order')):
+        column = cols[values]
+        order = sorted(range(len(column)), key=column.__getitem__)
+        cols[order_name].extend(order)
+        cols[sorted_name].extend(column[i] for i in order)
+
+    if len(categories) > 0xFFFF or len(shapes) > 0xFFFF:
+        raise ValueError('too many distinct categories or key orders')
+    cols['category_table'].extend(categories)
+    cols['shape_table'].extend(shapes)
+
+    blob = bytearray()
+    for s in strings.strings:
+        cols['string_offsets'].append(len(blob))
+        blob += s.encode('utf-8')
+    cols['string_offsets'].append(len(blob))
+    cols['string_blob'] = array('B', blob)
+
+    if sys.byteorder != 'little':
+        for name, code in SECTIONS:
+            if code != 'B':
+                cols[name].byteswap()
+
+    # Lay the sections out after the header, each 8-byte aligned for the casts
+    offsets = []
+    position = HEADER.size
+    for name, _ in SECTIONS:
+        position = (position + 7) & ~7
+        offsets.append((position, len(cols[name])))
+        position += len(cols[name]) * cols[name].itemsize
+    out = bytearray(position)
+    HEADER.pack_into(out, 0, MAGIC, len(words), source_sha256, *[v for pair in offsets for v in pair])
+    for (name, _), (start, count) in zip(SECTIONS, offsets):
+        data = cols[name].tobytes()
+        out[start:start + len(data)] = data
+    return bytes(out)
+
+
+# --- Reading ---
+
+class CompactCatalogFile:
+    """Read-only view of a compiled catalog backed by mmap."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        header = HEADER.unpack_from(buf, 0)
+        if header[0] != MAGIC:
+            raise ValueError(f"{path} is not a compact word catalog")
+        self.count = header[1]
+        self.source_sha256 = header[2]
+        for i, (name, code) in enumerate(SECTIONS):
+            start, count = header[3 + 2 * i], header[4 + 2 * i]
+            size = count * array(code).itemsize
+            view = buf[start:start + size]
+            if code != 'B':
+                view = view.cast(code)
+                if sys.byteorder != 'little':
+                    view = array(code, view.tobytes())
+                    view.byteswap()
+            setattr(self, '_' + name, view)
+        self.words = CompactWords(self)
+        self.by_id = _SortedIndex(self, self._sorted_ids, self._id_order, str)
+        self.by_rank = _SortedIndex(self, self._sorted_ranks, self._rank_order, int)
+        self._shape_cache = {}
+
+    def string(self, sid):
+        if sid == NONE:
+            return None
+        offsets = self._string_offsets
+        return str(self._string_blob[offsets[sid]:offsets[sid + 1]], 'utf-8')
+
+    def shape(self, i):
+        code = self._shapes[i]
+        keys = self._shape_cache.get(code)
+        if keys is None:
+            keys = self._shape_cache[code] = tuple(json.loads(self.string(self._shape_table[code])))
+        return keys
+
+
+class CompactWord(Mapping):
+    """A word entry that decodes each field only when it is read."""
+
+    __slots__ = ('_file', '_index')
+
+    def __init__(self, file, index):
+        self._file = file
+        self._index = index
+
+    def __getitem__(self, key):
+        f, i = self._file, self._index
+        # compile_words requires these keys, so only the optional ones check the shape
+        if key == 'id':
+            return f._ids[i]
+        if key == 'rank':
+            return f._ranks[i]
+        if key == 'english':
+            return f.string(f._english[i])
+        if key == 'category':
+            return f.string(f._category_table[f._categories[i]])
+        if key == 'spanish':
+            refs = f._spanish_refs
+            return [f.string(refs[j]) for j in range(f._spanish_start[i], f._spanish_start[i + 1])]
+        if key not in f.shape(i):
+            raise KeyError(key)
+        if key == 'hint':
+            return f.string(f._hint[i])
+        if key == 'article':
+            return f.string(f._article[i])
+        return json.loads(f.string(f._extras[i]))[key]
+
+    def __iter__(self):
+        return iter(self._file.shape(self._index))
+
+    def __len__(self):
+        return len(self._file.shape(self._index))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CompactWords(Sequence):
+    def __init__(self, file):
+        self._file = file
+
+    def __len__(self):
+        return self._file.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return CompactWord(self._file, i)
+
+
+class _SortedIndex(Mapping):
+    """Mapping from id or rank to words, via binary search over a sorted column."""
+
+    def __init__(self, file, sorted_values, order, key_type):
+        self._file = file
+        self._values = sorted_values
+        self._order = order
+        self._key_type = key_type
+
+    def __getitem__(self, key):
+        try:
+            value = int(key)
+        except (TypeError, ValueError):
+            raise KeyError(key) from None
+        if self._key_type is str and key != str(value):
+            raise KeyError(key)
+        pos = bisect.bisect_left(self._values, value)
+        if pos == len(self._values) or self._values[pos] != value:
+            raise KeyError(key)
+        return CompactWord(self._file, self._order[pos])
+
+    def __iter__(self):
+        key_type = self._key_type
+        return (key_type(v) for v in self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def items(self):
+        return _SortedItems(self)
+
+    def values(self):
+        return _SortedValues(self)
+
+    def _pairs(self):
+        key_type, file = self._key_type, self._file
+        for value, index in zip(self._values, self._order):
+            yield key_type(value), CompactWord(file, index)
+
+
+# Walk the columns in order rather than looking every key up again
+
+class _SortedItems(ItemsView):
+    def __iter__(self):
+        return self._mapping._pairs()
+
+
+class _SortedValues(ValuesView):
+    def __iter__(self):
+        return (word for _, word in self._mapping._pairs())
+
+
+def open_compact(path, source_sha256):
+    """Open a compiled catalog if it exists and was built from this exact source."""
+    try:
+        compact = CompactCatalogFile(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if compact.source_sha256 != source_sha256:
+        return None
+    return compact
+
+
+def source_digest(raw):
+    return hashlib.sha256(raw).digest()
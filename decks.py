@@ -0,0 +1,132 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from catalog import WordCatalog
+
+DEFAULT_DECK = 'es'
+VALID_DECK = re.compile(r'[a-z0-9][a-z0-9_-]{0,31}')
+
+# Resident bytes per byte of a deck's JSON source once it is parsed and its
+# answer, near-miss, reverse and search indexes are built. Measured on the
+# bundled words.json with tracemalloc: about 4x for the word dicts and 19x
+# for the indexes (a compiled .bin saves the first part, not the second).
+RESIDENT_BYTES_PER_SOURCE_BYTE = 24
+
+
+class UnknownDeck(LookupError):
+    pass
+
+
+class DeckCache:
+    """Every vocabulary deck the app can serve, each a WordCatalog.
+
+    The default deck (WORDS_FILE) is always resident, so it can be built
+    before a preloading master forks. Other decks are `<name>.json` files in
+    `directory`, loaded on first use and kept in an LRU holding at most
+    `max_bytes` of estimated resident memory; the least recently used deck
+    is dropped first. A deck over the budget on its own is still served,
+    it just evicts everything else.
+
+    `on_evict(name)` is called after a deck is dropped, so whatever else
+    holds on to its catalog (learner indexes) can let go of it too;
+    otherwise the memory is not actually freed.
+    """
+
+    def __init__(self, default_path, directory, max_bytes, check_interval=2.0, on_evict=None):
+        self.default = WordCatalog(default_path, check_interval)
+        self.on_evict = on_evict
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.resident_bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self._decks = OrderedDict()  # name -> (catalog, its version, estimated bytes)
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def path_for(self, name):
+        return os.path.join(self.directory, f'{name}.json')
+
+    def exists(self, name):
+        return name == DEFAULT_DECK or (bool(VALID_DECK.fullmatch(name)) and os.path.isfile(self.path_for(name)))
+
+    def names(self):
+        try:
+            files = os.listdir(self.directory)
+        except OSError:
+            files = []
+        found = (f[:-len('.json')] for f in files if f.endswith('.json'))
+        return [DEFAULT_DECK] + sorted(n for n in found if n != DEFAULT_DECK and VALID_DECK.fullmatch(n))
+
+    def loaded(self):
+        """(name, estimated bytes) of the resident non-default decks, least recently used first."""
+        with self._lock:
+            return [(name, size) for name, (_, _, size) in self._decks.items()]
+
+    def get(self, name=DEFAULT_DECK):
+        """The named deck, refreshed like the default catalog; raises UnknownDeck."""
+        if name == DEFAULT_DECK:
+            return self.default.refresh()
+        with self._lock:
+            entry = self._decks.get(name)
+            if entry is not None:
+                self._decks.move_to_end(name)
+        if entry is None:
+            return self._load(name)
+        deck, version, _ = entry
+        deck.refresh()
+        if deck.version != version:
+            self._account(name, deck)
+        return deck
+
+    def _load(self, name):
+        if not self.exists(name):
+            raise UnknownDeck(name)
+        # One loader per deck; concurrent requests for it wait instead of parsing it again
+        with self._lock:
+            loading = self._loading.setdefault(name, threading.Lock())
+        with loading:
+            with self._lock:
+                entry = self._decks.get(name)
+            if entry is not None:
+                return entry[0]
+            deck = WordCatalog(self.path_for(name), self.check_interval)
+            try:
+                deck.refresh()
+            except FileNotFoundError:
+                raise UnknownDeck(name) from None
+            finally:
+                with self._lock:
+                    self._loading.pop(name, None)
+            self._account(name, deck)
+            with self._lock:
+                self.loads += 1
+            return deck
+
+    def _account(self, name, deck):
+        size = estimated_bytes(deck)
+        evicted = []
+        with self._lock:
+            previous = self._decks.pop(name, None)
+            if previous is not None:
+                self.resident_bytes -= previous[2]
+            self._decks[name] = (deck, deck.version, size)
+            self.resident_bytes += size
+            while self.resident_bytes > self.max_bytes and len(self._decks) > 1:
+                old, (_, _, old_size) = self._decks.popitem(last=False)
+                self.resident_bytes -= old_size
+                self.evictions += 1
+                evicted.append(old)
+        if self.on_evict is not None:
+            for old in evicted:
+                self.on_evict(old)
+
+
+def estimated_bytes(deck):
+    try:
+        return os.path.getsize(deck.path) * RESIDENT_BYTES_PER_SOURCE_BYTE
+    except OSError:
+        return 0
@@ -0,0 +1,57 @@
+"""gunicorn settings, picked up automatically when started from this directory:
+
+    gunicorn
+
+The master imports the app and builds the word catalog, answer indexes and
+/api/words payloads once (preload_app), then freezes the garbage collector
+so those objects are never touched by a collection and their pages stay
+shared copy-on-write with every worker. Workers boot by forking, without
+re-reading words.json. Only the default deck is preloaded; decks from
+DECKS_DIR are loaded by each worker on first use and capped per worker at
+DECK_CACHE_MB.
+
+Workers and threads: one worker per CPU core (WEB_CONCURRENCY, default
+cpu_count) with 4 threads each (GUNICORN_THREADS). Requests are short and
+mostly CPU-bound, so extra workers beyond the core count only add memory;
+the threads cover the SQLite and network waits. scripts/bench_workers.py
+compares memory and startup against running without this file.
+"""
+
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+preload_app = True
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+
+# This file is read before the app is preloaded; no collections until when_ready,
+# so the objects built while preloading are not left half-aged in young generations
+gc.disable()
+
+
+def when_ready(server):
+    # Move everything built while preloading into the permanent generation before workers are forked
+    gc.freeze()
+    gc.enable()
+
+
+def post_fork(server, worker):
+    from app import init_worker
+    init_worker()
+
+
+def worker_exit(server, worker):
+    # Write back progress still held by the write-behind cache before the worker goes away
+    from app import answer_log, user_states
+    user_states.close()
+    answer_log.flush()
+
+
+def child_exit(server, worker):
+    # A dead worker's metrics dump would otherwise be added into every scrape forever
+    from metrics import metrics
+    metrics.discard_process(worker.pid)
@@ -0,0 +1,305 @@
+import heapq
+import random
+import time
+from itertools import islice
+
+from payloads import WORDS_PER_LEVEL
+
+# Word states used by the index
+UNSEEN = 'unseen'
+ACTIVE = 'active'
+REVIEW = 'review'
+MASTERED = 'mastered'
+
+# Values of the 'scheduling' setting
+MASTERY = 'mastery'
+SPACED = 'sm2'
+SCHEDULING_MODES = (MASTERY, SPACED)
+
+
+def word_state(wp):
+    """Classify a word the same way the next-word selection always has."""
+    if wp.get('mastered', False):
+        # Mastered words only come back for review if the first attempt was wrong
+        return REVIEW if wp.get('first_attempt_correct') is False else MASTERED
+    if wp.get('times_shown', 0) > 0:
+        return ACTIVE
+    return UNSEEN
+
+
+class RandomPool:
+    """Set of word ids with O(1) add, remove and uniform random choice."""
+
+    def __init__(self):
+        self.items = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, word_id):
+        return word_id in self.positions
+
+    def add(self, word_id):
+        if word_id not in self.positions:
+            self.positions[word_id] = len(self.items)
+            self.items.append(word_id)
+
+    def remove(self, word_id):
+        pos = self.positions.pop(word_id, None)
+        if pos is None:
+            return
+        last = self.items.pop()
+        if pos < len(self.items):
+            # Move the last item into the hole
+            self.items[pos] = last
+            self.positions[last] = pos
+
+    def choice(self, rng=random):
+        return self.items[rng.randrange(len(self.items))]
+
+
+# How each word state is reported in progress summaries
+SUMMARY_BUCKETS = {UNSEEN: 'unseen', ACTIVE: 'active', REVIEW: 'mastered', MASTERED: 'mastered'}
+
+
+def empty_counts():
+    return {'mastered': 0, 'active': 0, 'unseen': 0}
+
+
+class StateCounters:
+    """Mastered/active/unseen counts overall, per 1,000-rank level and per category.
+
+    Kept in step with state changes, so a summary never walks the catalog.
+    """
+
+    def __init__(self):
+        self.totals = empty_counts()
+        self.by_level = {}
+        self.by_category = {}
+
+    def add(self, word, state, amount=1):
+        bucket = SUMMARY_BUCKETS[state]
+        level = (word['rank'] - 1) // WORDS_PER_LEVEL + 1
+        self.totals[bucket] += amount
+        self.by_level.setdefault(level, empty_counts())[bucket] += amount
+        self.by_category.setdefault(word['category'], empty_counts())[bucket] += amount
+
+    def move(self, word, old, new):
+        if SUMMARY_BUCKETS[old] != SUMMARY_BUCKETS[new]:
+            self.add(word, old, -1)
+            self.add(word, new)
+
+    def as_dict(self):
+        return {'totals': self.totals, 'by_level': self.by_level, 'by_category': self.by_category}
+
+
+def heap_order(heap, is_current):
+    """Yield the heap's current entries in sorted order without popping them.
+
+    Walks the heap as a tree with a small frontier heap, so taking the
+    first k entries costs O(k log k) plus any stale entries skipped on the
+    way, instead of sorting the whole heap.
+    """
+    frontier = [(heap[0], 0)] if heap else []
+    while frontier:
+        entry, i = heapq.heappop(frontier)
+        if is_current(entry):
+            yield entry
+        for child in (2 * i + 1, 2 * i + 2):
+            if child < len(heap):
+                heapq.heappush(frontier, (heap[child], child))
+
+
+def draw_without_replacement(items, rng=random):
+    """Yield items in random order, drawing lazily (sparse Fisher-Yates)."""
+    swapped = {}
+    n = len(items)
+    for i in range(n):
+        j = rng.randrange(i, n)
+        yield swapped.get(j, items[j])
+        swapped[j] = swapped.get(i, items[i])
+
+
+class LearnerIndex:
+    """Per-learner selection state kept in step with recorded answers.
+
+    Unseen words sit in a rank-ordered heap (stale entries are dropped lazily
+    when they reach the top); active and review words live in RandomPools.
+    Picking the next word costs O(1) amortised instead of a catalog scan.
+    `counters` holds the progress summary counts for the same states.
+    """
+
+    def __init__(self, catalog, word_progress):
+        self.catalog = catalog
+        self.states = {}
+        self.unseen = []
+        self.active = RandomPool()
+        self.review = RandomPool()
+        self.counters = StateCounters()
+        for word_id, word in catalog.by_id.items():
+            state = word_state(word_progress.get(word_id, {}))
+            self.states[word_id] = state
+            self.counters.add(word, state)
+            if state == UNSEEN:
+                self.unseen.append((word['rank'], word_id))
+            elif state == ACTIVE:
+                self.active.add(word_id)
+            elif state == REVIEW:
+                self.review.add(word_id)
+        heapq.heapify(self.unseen)
+
+    def update(self, word_id, wp):
+        """Move a word to the pool matching its new progress record."""
+        word_id = str(word_id)
+        word = self.catalog.get(word_id)
+        if word is None:
+            return
+        old = self.states.get(word_id)
+        new = word_state(wp)
+        if old == new:
+            return
+        self.states[word_id] = new
+        self.counters.move(word, old, new)
+        if old == ACTIVE:
+            self.active.remove(word_id)
+        elif old == REVIEW:
+            self.review.remove(word_id)
+        if new == UNSEEN:
+            heapq.heappush(self.unseen, (word['rank'], word_id))
+        elif new == ACTIVE:
+            self.active.add(word_id)
+        elif new == REVIEW:
+            self.review.add(word_id)
+
+    def check_counters(self, word_progress):
+        """Rebuild the summary counts from scratch and list where they differ.
+
+        Returns [(scope, key, maintained, rebuilt), ...]; empty when consistent.
+        """
+        rebuilt = StateCounters()
+        for word_id, word in self.catalog.by_id.items():
+            rebuilt.add(word, word_state(word_progress.get(word_id, {})))
+        mismatches = []
+        if self.counters.totals != rebuilt.totals:
+            mismatches.append(('totals', None, self.counters.totals, rebuilt.totals))
+        for scope in ('by_level', 'by_category'):
+            kept, fresh = getattr(self.counters, scope), getattr(rebuilt, scope)
+            for key in sorted(set(kept) | set(fresh), key=str):
+                counts, expected = kept.get(key, empty_counts()), fresh.get(key, empty_counts())
+                if counts != expected:
+                    mismatches.append((scope, key, counts, expected))
+        return mismatches
+
+    def first_unseen(self):
+        """Lowest-ranked word that has never been shown, or None."""
+        heap = self.unseen
+        while heap and self.states[heap[0][1]] != UNSEEN:
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
+    def select(self, rng=random):
+        """Pick the next word id, or None when everything is mastered."""
+        planned = self.plan(1, rng)
+        return planned[0] if planned else None
+
+    def plan(self, count, rng=random):
+        """Up to `count` distinct upcoming word ids, in one pass over the pools.
+
+        Each pick follows the selection policy: 5% chance to review a
+        mastered word that was initially gotten wrong, otherwise 80% new
+        word by frequency rank / 20% random active word. New words are
+        taken in rank order and pool words drawn without repeats, as if
+        each planned word were answered without changing its state.
+        """
+        self.first_unseen()  # drop stale entries from the top before walking the heap
+        new_words = (word_id for _, word_id in heap_order(self.unseen, lambda e: self.states[e[1]] == UNSEEN))
+        active = draw_without_replacement(self.active.items, rng)
+        review = draw_without_replacement(self.review.items, rng)
+        next_new, next_active, next_review = next(new_words, None), next(active, None), next(review, None)
+        planned = []
+        while len(planned) < count and (next_active is not None or next_new is not None):
+            if next_review is not None and rng.random() < 0.05:
+                planned.append(next_review)
+                next_review = next(review, None)
+            elif next_active is not None and (next_new is None or rng.random() < 0.2):
+                planned.append(next_active)
+                next_active = next(active, None)
+            else:
+                planned.append(next_new)
+                next_new = next(new_words, None)
+        return planned
+
+
+class ScheduledIndex(LearnerIndex):
+    """Selection for the spaced-repetition ('sm2') scheduling mode.
+
+    Every practiced word sits in a heap keyed by its `due` time (seconds
+    since the epoch, set by the client's SM-2 update; practiced words
+    without one are due immediately). The most overdue word is at the top,
+    so picking it is O(log n) with stale entries skipped lazily. When
+    nothing is due the next unseen word by rank is introduced, and once
+    every word has been seen the soonest-due word is practiced early.
+    """
+
+    def __init__(self, catalog, word_progress):
+        super().__init__(catalog, word_progress)
+        self.due = {}
+        self.queue = []
+        for word_id, state in self.states.items():
+            if state != UNSEEN:
+                due = word_progress[word_id].get('due', 0)
+                self.due[word_id] = due
+                self.queue.append((due, word_id))
+        heapq.heapify(self.queue)
+
+    def update(self, word_id, wp):
+        super().update(word_id, wp)
+        word_id = str(word_id)
+        if self.states.get(word_id, UNSEEN) == UNSEEN:
+            self.due.pop(word_id, None)
+            return
+        due = wp.get('due', 0)
+        if self.due.get(word_id) != due:
+            self.due[word_id] = due
+            heapq.heappush(self.queue, (due, word_id))
+
+    def next_due(self):
+        """(due, word_id) of the most overdue practiced word, or None."""
+        queue = self.queue
+        while queue and self.due.get(queue[0][1]) != queue[0][0]:
+            heapq.heappop(queue)
+        return queue[0] if queue else None
+
+    def select(self, rng=random, now=None):
+        planned = self.plan(1, rng, now)
+        return planned[0] if planned else None
+
+    def plan(self, count, rng=random, now=None):
+        """Up to `count` upcoming word ids: overdue words, then new ones, then the soonest due."""
+        now = time.time() if now is None else now
+        self.next_due()
+        self.first_unseen()
+        scheduled = heap_order(self.queue, lambda e: self.due.get(e[1]) == e[0])
+        planned = []
+        upcoming = []
+        for due, word_id in scheduled:
+            if due > now:
+                upcoming.append(word_id)
+                break
+            planned.append(word_id)
+            if len(planned) == count:
+                return planned
+        for _, word_id in heap_order(self.unseen, lambda e: self.states[e[1]] == UNSEEN):
+            planned.append(word_id)
+            if len(planned) == count:
+                return planned
+        # Everything seen and nothing overdue: practice what is due soonest
+        upcoming.extend(word_id for _, word_id in islice(scheduled, count - len(planned) - 1))
+        return planned + upcoming[:count - len(planned)]
+
+
+def build_learner_index(catalog, word_progress, scheduling=MASTERY):
+    if scheduling == SPACED:
+        return ScheduledIndex(catalog, word_progress)
+    return LearnerIndex(catalog, word_progress)
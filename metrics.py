@@ -0,0 +1,181 @@
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+
+class Metrics:
+    """Counters and histograms rendered in the Prometheus text format.
+
+    Recording is a dict update under a lock. When `directory` is set each
+    process also dumps its totals there from maybe_dump() (at most every
+    `dump_interval` seconds) and render() adds up the dumps of every
+    process, so gunicorn workers report a single set of numbers whichever
+    worker is scraped.
+    """
+
+    def __init__(self, directory=None, dump_interval=1.0):
+        self.directory = directory
+        self.dump_interval = dump_interval
+        self.families = {}
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+        self._dumped_at = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def reset(self):
+        """Forget everything recorded so far (a forked worker starts from zero)."""
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self._dumped_at = 0.0
+
+    def counter(self, name, help_text):
+        self.families[name] = ('counter', help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.families[name] = ('histogram', help_text, buckets)
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        buckets = self.families[name][2]
+        key = (name, labels)
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                # per-bucket counts (not cumulative), then +Inf, sum
+                series = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            series[bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def timed(self, operation, name='fq_operation_duration_seconds'):
+        """Decorator recording how long each call takes, labelled by operation."""
+        labels = (('operation', operation),)
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, labels)
+            return wrapper
+        return decorator
+
+    # --- Aggregation across processes ---
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[n, list(l), v] for (n, l), v in self.counters.items()],
+                'histograms': [[n, list(l), list(v)] for (n, l), v in self.histograms.items()],
+            }
+
+    def _dump_path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def maybe_dump(self, force=False):
+        if not self.directory:
+            return
+        # One thread dumps at a time; the others skip rather than wait, or share the .tmp file
+        if not self._dump_lock.acquire(blocking=force):
+            return
+        try:
+            now = time.monotonic()
+            if not force and now - self._dumped_at < self.dump_interval:
+                return
+            self._dumped_at = now
+            path = self._dump_path(os.getpid())
+            tmp = f'{path}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        finally:
+            self._dump_lock.release()
+
+    def discard_process(self, pid):
+        """Drop the dump of a process that has exited, so its totals stop being added in."""
+        if not self.directory:
+            return
+        for path in (self._dump_path(pid), self._dump_path(pid) + '.tmp'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _collect(self):
+        counters = {}
+        histograms = {}
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = os.path.join(self.directory, f'{os.getpid()}.json')
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        for snap in snapshots:
+            for name, labels, value in snap['counters']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in snap['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.get(key)
+                histograms[key] = values if merged is None else [a + b for a, b in zip(merged, values)]
+        return counters, histograms
+
+    def render(self):
+        counters, histograms = self._collect()
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self.families.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            for (n, labels), values in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], values[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {values[-1]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+metrics = Metrics(os.environ.get('METRICS_DIR'))
+metrics.histogram('fq_http_request_duration_seconds', 'Time spent handling HTTP requests.')
+metrics.histogram('fq_http_response_size_bytes', 'Size of HTTP response bodies.', SIZE_BUCKETS)
+metrics.histogram('fq_operation_duration_seconds', 'Time spent in catalog, progress and answer-check operations.')
+metrics.counter('fq_answer_verdicts_total', 'Answer checks by verdict and strictness.')
@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import json
+
+from answers import build_article_answers, requires_article, reverse_prompt
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the json module gives the same bytes, slower
+    orjson = None
+
+WORDS_PER_LEVEL = 1000
+
+
+def level_range(level):
+    """Rank range for a level, matching getLevelRange in static/app.js."""
+    return (level - 1) * WORDS_PER_LEVEL + 1, level * WORDS_PER_LEVEL
+
+
+def _build_max_level(catalog):
+    top_rank = max(catalog.by_rank, default=0)
+    return max(1, -(-top_rank // WORDS_PER_LEVEL))
+
+
+def max_level(catalog):
+    """Highest level with words; the rank scan runs once per catalog version."""
+    return catalog.derived('max_level', _build_max_level)
+
+
+def encode_json(data):
+    """Compact UTF-8 JSON, the form every pre-encoded body and fragment uses."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class EncodedPayload:
+    """A JSON response body serialized once, with precompressed variants."""
+
+    def __init__(self, data):
+        self.raw = encode_json(data)
+        self.etag = hashlib.sha256(self.raw).hexdigest()[:32]
+        self.encoded = {'gzip': gzip.compress(self.raw, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(self.raw, quality=11)
+
+    def variant_etag(self, encoding):
+        return self.etag if encoding is None else f"{self.etag}-{encoding}"
+
+    def variant_etags(self):
+        return [self.variant_etag(None)] + [self.variant_etag(enc) for enc in self.encoded]
+
+    def body(self, encoding):
+        return self.raw if encoding is None else self.encoded[encoding]
+
+
+def word_listing(word):
+    return {
+        'id': word['id'],
+        'english': word['english'],
+        'rank': word['rank'],
+        'category': word['category'],
+        'hint': word.get('hint', ''),
+        'article': word.get('article'),
+    }
+
+
+def reverse_listing(word):
+    """Card for reverse mode: the Spanish prompt, without the English answer."""
+    return {
+        'id': word['id'],
+        'prompt': reverse_prompt(word),
+        'rank': word['rank'],
+        'category': word['category'],
+    }
+
+
+def build_words_payload(catalog, level=None, listing=word_listing):
+    """Encoded /api/words body for the whole catalog or a single level."""
+    words = catalog.words
+    if level is not None:
+        low, high = level_range(level)
+        words = [w for w in words if low <= w['rank'] <= high]
+    return EncodedPayload({'words': [listing(w) for w in words]})
+
+
+class CardPayloads:
+    """Every word's quiz card, built and encoded once per catalog version.
+
+    `cards` holds the dicts and `encoded` their JSON, both keyed by string
+    word id, so a response can splice cards in without serializing them.
+    """
+
+    def __init__(self, catalog, listing=word_listing):
+        self.cards = {}
+        self.encoded = {}
+        for word in catalog.words:
+            word_id = str(word['id'])
+            card = self.cards[word_id] = listing(word)
+            self.encoded[word_id] = encode_json(card)
+
+
+def _reveal(valid_answers, article):
+    # The '"valid_answers":...,"article":...' members, without the braces
+    return valid_answers, article, encode_json({'valid_answers': valid_answers, 'article': article})[1:-1]
+
+
+class AnswerPayloads:
+    """What grading an answer reveals about each word, built once per catalog version.
+
+    For every word: the accepted answers, its article and both encoded as
+    the tail of an /api/check-answer body. High strictness shows nouns with
+    their article; reverse mode shows the English gloss.
+    """
+
+    def __init__(self, catalog):
+        self.forward = {}
+        self.high = {}
+        self.reverse = {}
+        for word in catalog.words:
+            word_id = str(word['id'])
+            article = word.get('article')
+            self.forward[word_id] = _reveal(list(word['spanish']), article)
+            if requires_article(word):
+                self.high[word_id] = _reveal(build_article_answers(word['spanish'], article), article)
+            self.reverse[word_id] = _reveal([word['english']], None)
+
+    def reveal(self, word_id, strictness, reverse=False):
+        """(valid_answers, article, encoded members) for a word the catalog has."""
+        if reverse:
+            return self.reverse[word_id]
+        if strictness == 'high' and word_id in self.high:
+            return self.high[word_id]
+        return self.forward[word_id]
@@ -0,0 +1,521 @@
+import json
+import math
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+from metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    total_practiced INTEGER NOT NULL DEFAULT 0,
+    total_correct INTEGER NOT NULL DEFAULT 0,
+    session_count INTEGER NOT NULL DEFAULT 1,
+    last_session TEXT NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0,
+    reset_revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS word_progress (
+    user_id TEXT NOT NULL,
+    word_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, word_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS settings (
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (user_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS legacy_progress (
+    user_id TEXT PRIMARY KEY,
+    claimed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Review sessions live in a per-shard file of their own, attached as 'sessions':
+# they are throwaway, so their commits skip the fsync progress writes pay
+SESSIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions.review_sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    cursor INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions.review_session_words (
+    session_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    word_id TEXT NOT NULL,
+    PRIMARY KEY (session_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions.review_sessions_by_user ON review_sessions (user_id, last_used);
+CREATE INDEX IF NOT EXISTS sessions.review_sessions_by_last_used ON review_sessions (last_used);
+"""
+
+# Columns added after the first release, created on shards that predate them,
+# with the statement that fills them in for the existing rows
+ADDED_COLUMNS = (
+    ('users', 'reset_revision', 'INTEGER NOT NULL DEFAULT 0', None),
+    # Rows from before delta sync count as written at revision 1, so a first sync sends them
+    ('word_progress', 'revision', 'INTEGER NOT NULL DEFAULT 0', 'UPDATE word_progress SET revision = 1'),
+)
+INDEXES = """
+CREATE INDEX IF NOT EXISTS word_progress_by_revision ON word_progress (user_id, revision);
+"""
+
+# Tries (50 ms apart) at switching a new shard file to WAL while other workers race us
+WAL_SWITCH_ATTEMPTS = 100
+
+# Largest number of word ids bound into one IN (...) query
+SQL_IN_CHUNK = 500
+
+DEFAULT_SETTINGS = {'strictness': 'medium', 'theme': 'default', 'scheduling': 'mastery'}
+
+# Progress from the old single-user user_progress.json is imported under a
+# random id in this shard, next to the legacy_progress row that records it
+LEGACY_SHARD = 0
+
+UPSERT_USER = """
+INSERT INTO users (user_id, total_practiced, total_correct, last_session, revision)
+VALUES (?, ?, ?, ?, 1)
+ON CONFLICT (user_id) DO UPDATE SET
+    total_practiced = total_practiced + excluded.total_practiced,
+    total_correct = total_correct + excluded.total_correct,
+    last_session = CASE WHEN excluded.total_practiced > 0 THEN excluded.last_session ELSE last_session END,
+    revision = revision + 1
+"""
+
+
+def default_progress():
+    return {
+        'user_stats': {
+            'total_practiced': 0,
+            'total_correct': 0,
+            'session_count': 1,
+            'last_session': datetime.now().isoformat(),
+        },
+        'word_progress': {},
+        'settings': dict(DEFAULT_SETTINGS),
+    }
+
+
+class ProgressStore:
+    """Per-user learner progress in SQLite (WAL mode), split across shard files.
+
+    Every row is keyed by user id and each user always maps to the same
+    shard, so loading or writing one user's progress only touches that
+    user's rows and only takes that shard's write lock. Writes are upserts
+    of the changed rows, so persisting an answer costs the same no matter
+    how much has been practiced. Each user's `revision` is bumped on every
+    write so callers can tell cheaply whether cached state is stale.
+    """
+
+    def __init__(self, directory, shards=16, legacy_json=None):
+        self.directory = directory
+        self.shards = shards
+        self._local = threading.local()
+        self._legacy_claimed = False
+        os.makedirs(directory, exist_ok=True)
+        for shard in range(shards):
+            conn = self._conn(shard)
+            conn.executescript(SCHEMA)
+            for table, column, definition, backfill in ADDED_COLUMNS:
+                if column not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+                    if backfill:
+                        conn.execute(backfill)
+            conn.executescript(INDEXES)
+            # Sessions used to be kept here, whole id lists as JSON; they expire anyway
+            conn.execute('DROP TABLE IF EXISTS main.review_sessions')
+            conn.executescript(SESSIONS_SCHEMA)
+        if legacy_json and os.path.exists(legacy_json):
+            self._migrate_json(legacy_json)
+
+    def shard_for(self, user_id):
+        return zlib.crc32(user_id.encode('utf-8')) % self.shards
+
+    def _connect(self, shard):
+        path = os.path.join(self.directory, f'progress-{shard:02d}.sqlite3')
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA busy_timeout=10000')
+        conn.execute('ATTACH DATABASE ? AS sessions', (os.path.join(self.directory, f'sessions-{shard:02d}.sqlite3'),))
+        for schema in ('main', 'sessions'):
+            switch_to_wal(conn, schema)
+        # fsync the WAL on every commit, so a flushed batch survives a power loss
+        conn.execute('PRAGMA main.synchronous=FULL')
+        # A session lost in a power cut is just started again
+        conn.execute('PRAGMA sessions.synchronous=NORMAL')
+        return conn
+
+    def _conn(self, shard):
+        # One connection per shard, thread and process (connections must not cross a fork)
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conns = {}
+            local.pid = os.getpid()
+        conn = local.conns.get(shard)
+        if conn is None:
+            conn = local.conns[shard] = self._connect(shard)
+        return conn
+
+    @contextmanager
+    def _transaction(self, user_id, write=True):
+        with self._shard_transaction(self.shard_for(user_id), write) as conn:
+            yield conn
+
+    @contextmanager
+    def _shard_transaction(self, shard, write=True):
+        # BEGIN IMMEDIATE takes the shard's write lock up front so concurrent writers queue
+        conn = self._conn(shard)
+        conn.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _migrate_json(self, path):
+        """Import the old single-user user_progress.json, for claim_legacy_user() to hand out.
+
+        Every worker may try this at import; the shard's write lock lets one
+        of them in at a time and the rest find the import already there (or
+        the file already renamed away).
+        """
+        user_id = self._new_legacy_user_id()
+        with self._shard_transaction(LEGACY_SHARD) as conn:
+            if conn.execute('SELECT 1 FROM legacy_progress').fetchone():
+                return
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    progress = json.load(f)
+            except FileNotFoundError:
+                return
+            stats = progress.get('user_stats', {})
+            conn.execute(
+                'INSERT INTO users (user_id, total_practiced, total_correct, session_count, last_session, revision) '
+                'VALUES (?, ?, ?, ?, ?, 1)',
+                (
+                    user_id,
+                    stats.get('total_practiced', 0),
+                    stats.get('total_correct', 0),
+                    stats.get('session_count', 1),
+                    stats.get('last_session', datetime.now().isoformat()),
+                ),
+            )
+            self._write_rows(conn, user_id, progress.get('word_progress', {}), progress.get('settings', {}), 1)
+            conn.execute('INSERT INTO legacy_progress (user_id) VALUES (?)', (user_id,))
+        os.replace(path, path + '.migrated')
+
+    def _new_legacy_user_id(self):
+        # Unguessable like any issued id, but in LEGACY_SHARD so the import commits in one transaction
+        while True:
+            user_id = secrets.token_urlsafe(16)
+            if self.shard_for(user_id) == LEGACY_SHARD:
+                return user_id
+
+    def claim_legacy_user(self):
+        """The imported user_progress.json's user id, the first time only; then None.
+
+        The old app had a single learner and no ids, so whoever first shows
+        up without one is that learner.
+        """
+        if self._legacy_claimed:
+            return None
+        with self._shard_transaction(LEGACY_SHARD) as conn:
+            row = conn.execute('SELECT user_id FROM legacy_progress WHERE claimed = 0').fetchone()
+            if row:
+                conn.execute('UPDATE legacy_progress SET claimed = 1 WHERE user_id = ?', (row[0],))
+        # Nothing is imported after startup, so there is nothing left to claim in this process
+        self._legacy_claimed = True
+        return row[0] if row else None
+
+    def _write_rows(self, conn, user_id, words, settings, revision):
+        conn.executemany(
+            'INSERT OR REPLACE INTO word_progress (user_id, word_id, data, revision) VALUES (?, ?, ?, ?)',
+            [(user_id, str(k), json.dumps(v), revision) for k, v in words.items()],
+        )
+        conn.executemany(
+            'INSERT OR REPLACE INTO settings (user_id, key, value) VALUES (?, ?, ?)',
+            [(user_id, k, json.dumps(v)) for k, v in settings.items()],
+        )
+
+    def revision(self, user_id):
+        row = self._conn(self.shard_for(user_id)).execute(
+            'SELECT revision FROM users WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def setting(self, user_id, key, default=None):
+        """One stored setting, read without loading the user's progress."""
+        row = self._conn(self.shard_for(user_id)).execute(
+            'SELECT value FROM settings WHERE user_id = ? AND key = ?', (user_id, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    @metrics.timed('load_progress')
+    def load(self, user_id):
+        """Return (progress, revision); progress has the old user_progress.json shape."""
+        progress = default_progress()
+        with self._transaction(user_id, write=False) as conn:
+            row = conn.execute(
+                'SELECT total_practiced, total_correct, session_count, last_session, revision '
+                'FROM users WHERE user_id = ?',
+                (user_id,),
+            ).fetchone()
+            if row is None:
+                return progress, 0
+            word_rows = conn.execute(
+                'SELECT word_id, data FROM word_progress WHERE user_id = ?', (user_id,)
+            ).fetchall()
+            setting_rows = conn.execute(
+                'SELECT key, value FROM settings WHERE user_id = ?', (user_id,)
+            ).fetchall()
+        progress['user_stats'] = {
+            'total_practiced': row[0],
+            'total_correct': row[1],
+            'session_count': row[2],
+            'last_session': row[3],
+        }
+        progress['word_progress'] = {word_id: json.loads(data) for word_id, data in word_rows}
+        progress['settings'].update((key, json.loads(value)) for key, value in setting_rows)
+        return progress, row[4]
+
+    @metrics.timed('save_progress')
+    def apply(self, user_id, words=None, settings=None, practiced=0, correct=0, last_session=None):
+        """Write changed word records and settings and add to the answer counters.
+
+        Returns the user's (previous, new) revision.
+        """
+        with self._transaction(user_id) as conn:
+            row = conn.execute('SELECT revision FROM users WHERE user_id = ?', (user_id,)).fetchone()
+            previous = row[0] if row else 0
+            conn.execute(UPSERT_USER, (user_id, practiced, correct, last_session or datetime.now().isoformat()))
+            self._write_rows(conn, user_id, words or {}, settings or {}, previous + 1)
+        return previous, previous + 1
+
+    @metrics.timed('sync_progress')
+    def sync(self, user_id, since, words, practiced=0, correct=0):
+        """Merge one device's changed word records and return what it has not seen.
+
+        `since` is the revision the device last synced at and `words` the
+        records it changed since then; each must carry an `updated_at`
+        timestamp, and the newer of the device's and the stored record wins.
+        practiced/correct are the device's answer counts since its last sync
+        and are added to the totals. Only the sent records and the rows
+        written after `since` are read, never the user's whole progress.
+
+        Returns a dict with the previous and new `revision`, the `accepted`
+        records that won, the `changes` (word rows newer than `since` that
+        the device does not already have), the `user_stats`, and `reset`,
+        which is True when the progress was reset after `since`; the
+        device's changes are then dropped and every row is sent back.
+        """
+        with self._transaction(user_id) as conn:
+            row = conn.execute(
+                'SELECT revision, reset_revision FROM users WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            previous, reset_revision = row if row else (0, 0)
+            reset = 0 < since < reset_revision
+            if reset:
+                words, practiced, correct, since = {}, 0, 0, 0
+
+            stored = self._read_words(conn, user_id, list(words))
+            accepted = {
+                word_id: record for word_id, record in words.items()
+                if word_id not in stored or _newer(record, stored[word_id])
+            }
+            revision = previous
+            if accepted or practiced:
+                revision = previous + 1
+                conn.execute(UPSERT_USER, (user_id, practiced, correct, datetime.now().isoformat()))
+                self._write_rows(conn, user_id, accepted, {}, revision)
+
+            # A device that has never synced gets every row, including any still at revision 0
+            changes = {
+                word_id: json.loads(data) for word_id, data in conn.execute(
+                    'SELECT word_id, data FROM word_progress WHERE user_id = ? AND revision > ?',
+                    (user_id, since if since else -1),
+                )
+                if word_id not in accepted
+            }
+            stats = conn.execute(
+                'SELECT total_practiced, total_correct, session_count, last_session FROM users WHERE user_id = ?',
+                (user_id,),
+            ).fetchone()
+        user_stats = default_progress()['user_stats']
+        if stats:
+            user_stats.update(zip(('total_practiced', 'total_correct', 'session_count', 'last_session'), stats))
+        return {
+            'previous': previous,
+            'revision': revision,
+            'accepted': accepted,
+            'changes': changes,
+            'user_stats': user_stats,
+            'reset': reset,
+        }
+
+    def _read_words(self, conn, user_id, word_ids):
+        found = {}
+        for start in range(0, len(word_ids), SQL_IN_CHUNK):
+            chunk = word_ids[start:start + SQL_IN_CHUNK]
+            marks = ','.join('?' * len(chunk))
+            for word_id, data in conn.execute(
+                f'SELECT word_id, data FROM word_progress WHERE user_id = ? AND word_id IN ({marks})',
+                [user_id, *chunk],
+            ):
+                found[word_id] = json.loads(data)
+        return found
+
+    def record_answer(self, user_id, word_id, wp, is_correct):
+        return self.apply(user_id, words={word_id: wp}, practiced=1, correct=1 if is_correct else 0)
+
+    def save_settings(self, user_id, settings):
+        return self.apply(user_id, settings=settings)
+
+    def create_review_session(self, user_id, session_id, word_ids, now, expired_before, keep):
+        """Store a new review session, dropping expired ones and all but the user's `keep` newest."""
+        with self._transaction(user_id) as conn:
+            # Anyone's expired sessions in this shard, or learners who never come back keep theirs
+            delete_review_sessions(conn, 'last_used < ?', (expired_before,))
+            conn.execute(
+                'INSERT INTO review_sessions (session_id, user_id, size, cursor, last_used) VALUES (?, ?, ?, 0, ?)',
+                (session_id, user_id, len(word_ids), now),
+            )
+            conn.executemany(
+                'INSERT INTO review_session_words (session_id, position, word_id) VALUES (?, ?, ?)',
+                [(session_id, position, word_id) for position, word_id in enumerate(word_ids)],
+            )
+            delete_review_sessions(
+                conn,
+                'user_id = ? AND session_id NOT IN '
+                '(SELECT session_id FROM review_sessions WHERE user_id = ? ORDER BY last_used DESC LIMIT ?)',
+                (user_id, user_id, keep),
+            )
+
+    def advance_review_session(self, user_id, session_id, now, expired_before, batch, advance):
+        """Move a live session's cursor under the shard's write lock.
+
+        `advance(size, cursor, word_ids)` gets the session's word ids from
+        the cursor on, read lazily `batch` rows at a time, and returns
+        (result, new cursor); the result is returned, or None if the
+        session is unknown or expired. Only the rows consumed are read.
+        """
+        with self._transaction(user_id) as conn:
+            row = conn.execute(
+                'SELECT size, cursor FROM review_sessions WHERE session_id = ? AND user_id = ? AND last_used >= ?',
+                (session_id, user_id, expired_before),
+            ).fetchone()
+            if row is None:
+                return None
+            size, cursor = row
+            result, cursor = advance(size, cursor, session_word_ids(conn, session_id, cursor, batch))
+            conn.execute(
+                'UPDATE review_sessions SET cursor = ?, last_used = ? WHERE session_id = ?', (cursor, now, session_id)
+            )
+        return result
+
+    def delete_review_session(self, user_id, session_id):
+        with self._transaction(user_id) as conn:
+            delete_review_sessions(conn, 'session_id = ? AND user_id = ?', (session_id, user_id))
+
+    def reset(self, user_id):
+        with self._transaction(user_id) as conn:
+            conn.execute('DELETE FROM word_progress WHERE user_id = ?', (user_id,))
+            conn.execute('DELETE FROM settings WHERE user_id = ?', (user_id,))
+            delete_review_sessions(conn, 'user_id = ?', (user_id,))
+            # Keep counting revisions up so stale caches still notice the reset
+            conn.execute(
+                'UPDATE users SET total_practiced = 0, total_correct = 0, session_count = 1, '
+                'last_session = ?, revision = revision + 1, reset_revision = revision + 1 WHERE user_id = ?',
+                (datetime.now().isoformat(), user_id),
+            )
+
+
+def switch_to_wal(conn, schema):
+    # Switching a new file to WAL fails at once instead of waiting out the busy
+    # timeout while another worker is doing the same at startup; retry it
+    for attempt in range(WAL_SWITCH_ATTEMPTS):
+        try:
+            conn.execute(f'PRAGMA {schema}.journal_mode=WAL')
+            return
+        except sqlite3.OperationalError:
+            if attempt == WAL_SWITCH_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05)
+
+
+def delete_review_sessions(conn, where, params):
+    """Delete the review sessions matching `where`, and their words."""
+    conn.execute(
+        f'DELETE FROM review_session_words WHERE session_id IN (SELECT session_id FROM review_sessions WHERE {where})',
+        params,
+    )
+    conn.execute(f'DELETE FROM review_sessions WHERE {where}', params)
+
+
+def session_word_ids(conn, session_id, cursor, batch):
+    """A session's word ids from position `cursor` on, fetched `batch` at a time."""
+    while True:
+        rows = conn.execute(
+            'SELECT word_id FROM review_session_words WHERE session_id = ? AND position >= ? '
+            'ORDER BY position LIMIT ?',
+            (session_id, cursor, batch),
+        ).fetchall()
+        if not rows:
+            return
+        for (word_id,) in rows:
+            yield word_id
+        cursor += len(rows)
+
+
+# The fields a word progress record may carry, and the types each accepts
+RECORD_FIELDS = {
+    'times_shown': 'count',
+    'times_correct': 'count',
+    'streak': 'count',
+    'reps': 'count',
+    'interval': 'count',
+    'mastered': 'flag',
+    'first_attempt_correct': 'flag',
+    'ease': 'number',
+    'due': 'number',
+    'updated_at': 'number',
+}
+
+
+def valid_record(record):
+    """True if a record sent by a client holds only known fields of the right types.
+
+    Counts are non-negative ints, flags are bools (first_attempt_correct
+    may also be null) and numbers are finite ints or floats.
+    """
+    if not isinstance(record, dict):
+        return False
+    for key, value in record.items():
+        kind = RECORD_FIELDS.get(key)
+        if kind == 'count':
+            ok = type(value) is int and value >= 0
+        elif kind == 'flag':
+            ok = isinstance(value, bool) or (value is None and key == 'first_attempt_correct')
+        elif kind == 'number':
+            ok = type(value) in (int, float) and math.isfinite(value)
+        else:
+            ok = False
+        if not ok:
+            return False
+    return True
+
+
+def _newer(record, stored):
+    """Last writer wins on `updated_at`; without timestamps the more practiced record wins."""
+    key = lambda r: (r.get('updated_at') or 0, r.get('times_shown', 0))
+    return key(record) > key(stored)
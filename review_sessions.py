@@ -0,0 +1,81 @@
+import random
+import secrets
+import time
+
+
+class ReviewSession:
+    """A shuffled snapshot of a learner's active words, handed out by cursor.
+
+    `word_ids` yields the session's words from `cursor` on; it may be read
+    lazily from the store, so only the words handed out are ever loaded.
+    """
+
+    __slots__ = ('session_id', 'user_id', 'size', 'cursor', 'word_ids')
+
+    def __init__(self, session_id, user_id, size, cursor=0, word_ids=()):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.size = size
+        self.cursor = cursor
+        self.word_ids = iter(word_ids)
+
+    @property
+    def remaining(self):
+        return self.size - self.cursor
+
+    def next_word_id(self, is_eligible):
+        """Advance past words that are no longer active and return the next one."""
+        for word_id in self.word_ids:
+            self.cursor += 1
+            if is_eligible(word_id):
+                return word_id
+        return None
+
+    def next_word_ids(self, count, is_eligible):
+        """Hand out up to `count` eligible words in one go."""
+        word_ids = []
+        while len(word_ids) < count:
+            word_id = self.next_word_id(is_eligible)
+            if word_id is None:
+                break
+            word_ids.append(word_id)
+        return word_ids
+
+
+class ReviewSessionStore:
+    """Review sessions kept in the learner's progress shard, so any worker can continue one.
+
+    Each word is stored in its own row by position, so handing out words
+    reads only those from the cursor on and costs the same however long
+    the session is. Handing them out and moving the stored cursor happen
+    in one transaction, so two requests for the same session never get the
+    same words. Sessions idle for `ttl` seconds expire (starting any
+    session drops the shard's expired ones), and starting a session drops
+    all but the learner's `max_per_user` most recent ones.
+    """
+
+    def __init__(self, store, ttl=1800, max_per_user=20):
+        self.store = store
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+
+    def create(self, user_id, word_ids, rng=random):
+        word_ids = list(word_ids)
+        rng.shuffle(word_ids)
+        session = ReviewSession(secrets.token_urlsafe(12), user_id, len(word_ids), word_ids=word_ids)
+        now = time.time()
+        self.store.create_review_session(user_id, session.session_id, word_ids, now, now - self.ttl, self.max_per_user)
+        return session
+
+    def next_word_ids(self, session_id, user_id, count, is_eligible):
+        """(words left before this call, up to `count` eligible word ids), or None if the session is gone."""
+        def advance(size, cursor, word_ids):
+            session = ReviewSession(session_id, user_id, size, cursor, word_ids)
+            remaining = session.remaining
+            return (remaining, session.next_word_ids(count, is_eligible)), session.cursor
+
+        now = time.time()
+        return self.store.advance_review_session(user_id, session_id, now, now - self.ttl, count, advance)
+
+    def discard(self, session_id, user_id):
+        self.store.delete_review_session(user_id, session_id)
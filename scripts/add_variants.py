@@ -2,22 +2,32 @@
 Script to add synonyms and gender variants to words.json
 
 Usage:
-    python scripts/add_variants.py [start_index] [end_index]
+    python scripts/add_variants.py [start_index end_index] [--jobs N] [--words-file PATH]
 
 Examples:
     python scripts/add_variants.py 0 1000      # Process words 1-1000
     python scripts/add_variants.py 1000 2000   # Process words 1001-2000
     python scripts/add_variants.py             # Process ALL words
+    python scripts/add_variants.py --jobs 8    # Spread the work over 8 processes
 
 The script will:
 1. Add masculine/feminine variants for adjectives (bueno -> bueno, buena)
-2. Add common synonyms (empezar -> empezar, comenzar)
+2. Add common synonyms (empezar -> empezar, comenzar), following chains of
+   synonyms (ver -> mirar -> observar)
 3. Add regional variants (carro -> carro, coche, auto)
+
+Each entry costs time proportional to its own variants: duplicates are
+found with a case-folded set and the synonym closure is computed once up
+front. The file is only written when some entry changed, and then
+atomically, so an interrupted run never leaves a truncated words.json.
 """
 
+import argparse
 import json
-import sys
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
 # Get the project root directory
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -168,13 +178,46 @@ no_gender_variant = {
 }
 
 
-def add_gender_variants(spanish_list, category):
+def synonym_closure(graph):
+    """Every synonym reachable from each word, nearest first.
+
+    Chains like ver -> mirar -> observar are followed to the end, so the
+    result no longer depends on which links happen to be listed.
+    """
+    closure = {}
+    for word in graph:
+        seen = {word}
+        order = []
+        queue = [word]
+        for current in queue:
+            for syn in graph.get(current, ()):
+                if syn not in seen:
+                    seen.add(syn)
+                    order.append(syn)
+                    queue.append(syn)
+        closure[word] = tuple(order)
+    return closure
+
+
+SYNONYM_CLOSURE = synonym_closure(synonyms)
+
+
+def _add_new(new_list, seen, candidate):
+    folded = candidate.casefold()
+    if folded not in seen:
+        seen.add(folded)
+        new_list.append(candidate)
+
+
+def add_gender_variants(spanish_list, category, seen=None):
     """Add masculine/feminine variants for adjectives only"""
     # Only apply to adjectives
     if category != 'adjective':
         return spanish_list
 
     new_list = list(spanish_list)
+    if seen is None:
+        seen = {w.casefold() for w in new_list}
     for word in spanish_list:
         word_lower = word.lower()
 
@@ -183,88 +226,156 @@ def add_gender_variants(spanish_list, category):
             continue
 
         if word_lower.endswith('o') and len(word) > 2:
-            feminine = word[:-1] + 'a'
-            if feminine not in new_list and feminine.lower() not in [w.lower() for w in new_list]:
-                new_list.append(feminine)
+            _add_new(new_list, seen, word[:-1] + 'a')
         elif word_lower.endswith('a') and len(word) > 2:
-            masculine = word[:-1] + 'o'
-            if masculine not in new_list and masculine.lower() not in [w.lower() for w in new_list]:
-                new_list.append(masculine)
+            _add_new(new_list, seen, word[:-1] + 'o')
     return new_list
 
 
-def add_synonyms(spanish_list):
+def add_synonyms(spanish_list, seen=None):
     """Add synonyms for known words"""
     new_list = list(spanish_list)
+    if seen is None:
+        seen = {w.casefold() for w in new_list}
     for word in spanish_list:
-        word_lower = word.lower()
-        if word_lower in synonyms:
-            for syn in synonyms[word_lower]:
-                if syn not in new_list and syn.lower() not in [w.lower() for w in new_list]:
-                    new_list.append(syn)
+        for syn in SYNONYM_CLOSURE.get(word.lower(), ()):
+            _add_new(new_list, seen, syn)
     return new_list
 
 
-def main():
-    # Parse arguments
-    if len(sys.argv) == 3:
-        start_idx = int(sys.argv[1])
-        end_idx = int(sys.argv[2])
-    elif len(sys.argv) == 1:
-        start_idx = 0
-        end_idx = None  # Process all
-    else:
+def enrich(spanish, category):
+    """Return the enriched answer list, or None if nothing was added."""
+    seen = {w.casefold() for w in spanish}
+    enriched = add_synonyms(add_gender_variants(spanish, category, seen), seen)
+    return enriched if len(enriched) > len(spanish) else None
+
+
+def _enrich_item(item):
+    return enrich(*item)
+
+
+def enrich_entries(entries, jobs=1, chunksize=2048):
+    """Yield (entry, enriched spanish list or None) for each entry, in order."""
+    entries = iter(entries)
+    if jobs <= 1:
+        for entry in entries:
+            yield entry, enrich(entry['spanish'], entry.get('category', ''))
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # Hand the pool a bounded batch at a time so memory stays flat
+        while True:
+            batch = list(islice(entries, chunksize * jobs * 4))
+            if not batch:
+                break
+            items = [(entry['spanish'], entry.get('category', '')) for entry in batch]
+            yield from zip(batch, pool.map(_enrich_item, items, chunksize=chunksize))
+
+
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+_encode_str = json.encoder.encode_basestring
+
+
+def _encode_value(value):
+    if isinstance(value, str):
+        return _encode_str(value)
+    if type(value) is int:
+        return str(value)
+    return _encode(value)
+
+
+def format_entry(entry, indent='    '):
+    """One word entry laid out exactly as json.dumps(indent=2) nests it in the list.
+
+    Entries are flat (scalars and lists of strings), so the layout is built
+    here and only the values go through the fast C encoder; anything nested
+    deeper falls back to json.dumps.
+    """
+    inner = indent + '  '
+    lines = []
+    for key, value in entry.items():
+        if isinstance(value, list) and value and all(isinstance(v, str) for v in value):
+            items = f',\n{inner}  '.join(map(_encode_str, value))
+            text = f'[\n{inner}  {items}\n{inner}]'
+        elif isinstance(value, (list, dict)) and value:
+            text = json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n' + inner)
+        else:
+            text = _encode_value(value)
+        lines.append(f'{inner}{_encode_str(key)}: {text}')
+    if not lines:
+        return indent + '{}'
+    return indent + '{\n' + ',\n'.join(lines) + '\n' + indent + '}'
+
+
+def write_words(path, data):
+    """Write words.json atomically, one entry at a time.
+
+    The output is identical to json.dump(data, indent=2, ensure_ascii=False)
+    plus a trailing newline, which is how words.json is kept.
+    """
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        keys = list(data)
+        for k, key in enumerate(keys):
+            f.write(f'  {_encode(key)}: ')
+            value = data[key]
+            if key != 'words' or not value:
+                f.write(json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n  '))
+            else:
+                f.write('[\n')
+                last = len(value) - 1
+                for i, entry in enumerate(value):
+                    f.write(format_entry(entry) + (',\n' if i < last else '\n'))
+                f.write('  ]')
+            f.write(',\n' if k < len(keys) - 1 else '\n')
+        f.write('}\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Add synonyms and gender variants to words.json.')
+    parser.add_argument('range', nargs='*', type=int, metavar='index', help='start_index end_index')
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes (default 1)')
+    parser.add_argument('--words-file', default=WORDS_FILE)
+    args = parser.parse_args(argv)
+    if len(args.range) not in (0, 2):
         print(__doc__)
         sys.exit(1)
 
     # Load the words
-    print(f"Loading {WORDS_FILE}...")
-    with open(WORDS_FILE, 'r', encoding='utf-8') as f:
+    print(f"Loading {args.words_file}...")
+    with open(args.words_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
-    total_words = len(data['words'])
-    if end_idx is None:
-        end_idx = total_words
+    words = data['words']
+    total_words = len(words)
+    start_idx, end_idx = args.range if args.range else (0, total_words)
+    end_idx = min(end_idx, total_words)
 
     print(f"Processing words {start_idx + 1} to {end_idx} (of {total_words} total)...")
 
-    # Process specified range
-    count_modified = 0
-    for i in range(start_idx, min(end_idx, total_words)):
-        word = data['words'][i]
-        spanish_original = list(word['spanish'])
-        spanish = list(word['spanish'])
-        category = word.get('category', '')
-
-        # Add gender variants (adjectives only)
-        spanish = add_gender_variants(spanish, category)
+    modified = []
+    for entry, enriched in enrich_entries(islice(words, start_idx, end_idx), jobs=args.jobs):
+        if enriched is not None:
+            entry['spanish'] = enriched
+            modified.append(entry)
 
-        # Add synonyms
-        spanish = add_synonyms(spanish)
+    if not modified:
+        print("Done! No entries needed new variants; words.json left untouched.")
+        return
 
-        # Update the word
-        data['words'][i]['spanish'] = spanish
-
-        if len(spanish) > len(spanish_original):
-            count_modified += 1
-
-    # Save the updated file
-    with open(WORDS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-    print(f"Done! Modified {count_modified} entries.")
+    write_words(args.words_file, data)
+    print(f"Done! Modified {len(modified)} entries.")
+    print("Run scripts/build_catalog.py to refresh the compact catalog.")
 
     # Show some examples of what changed
     print("\nExamples of modified words:")
-    shown = 0
-    for i in range(start_idx, min(end_idx, total_words)):
-        word = data['words'][i]
-        if len(word['spanish']) > 1:
-            print(f"  [{word.get('category', 'unknown')}] {word['english']}: {word['spanish']}")
-            shown += 1
-            if shown >= 20:
-                print("  ...")
-                break
+    for word in modified[:20]:
+        print(f"  [{word.get('category', 'unknown')}] {word['english']}: {word['spanish']}")
+    if len(modified) > 20:
+        print("  ...")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,406 @@
+"""
+Load benchmark for the hot API endpoints
+
+Usage:
+    python scripts/bench.py [options]
+
+Examples:
+    python scripts/bench.py                                   # in-process, 5k and 50k words
+    python scripts/bench.py --sizes 5000 50000 500000         # scale the catalog up to 500k words
+    python scripts/bench.py --progress empty full             # only the empty and fully practiced learner
+    python scripts/bench.py --mode gunicorn --workers 4       # against a local gunicorn server
+    python scripts/bench.py --save-baseline scripts/bench_baseline.json
+    python scripts/bench.py --compare scripts/bench_baseline.json
+
+The script generates a synthetic word catalog for each size and a learner
+whose progress is empty, half practiced or fully practiced, then reports
+throughput and p50/p95/p99 latency for /api/next-word, /api/check-answer,
+/api/words, /api/next-review-word and /api/progress.
+
+In-process mode runs each scenario in a fresh interpreter with the Flask
+test client, so module-level caches start cold for every scenario.
+Gunicorn mode starts `gunicorn app:app` on a local port, with an empty
+config so gunicorn.conf.py is not applied (scripts/bench_workers.py compares
+the two), and drives it with keep-alive connections from several threads.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+
+BENCH_USER = 'bench'
+ENDPOINTS = ('next-word', 'check-answer', 'words', 'next-review-word', 'progress')
+PROGRESS_LEVELS = ('empty', 'half', 'full')
+CATEGORIES = ('noun', 'verb', 'adjective', 'adverb', 'noun', 'noun', 'verb', 'adjective')
+STRICTNESS_LEVELS = ('high', 'medium', 'low')
+
+
+# --- Fixtures ---
+
+def generate_words(size, seed=0):
+    """Synthetic catalog shaped like words.json (ids and ranks 1..size)."""
+    rng = random.Random(seed)
+    words = []
+    for i in range(1, size + 1):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        stem = f"palabr{i:x}"
+        spanish = [stem + 'o']
+        if category == 'adjective':
+            spanish.append(stem + 'a')
+        if rng.random() < 0.2:
+            spanish.append(f"sinónimo{i:x}")
+        word = {
+            'id': i,
+            'english': f"word {i}, term {i}",
+            'spanish': spanish,
+            'rank': i,
+            'category': category,
+        }
+        if category == 'noun':
+            word['article'] = 'el' if i % 2 else 'la'
+        words.append(word)
+    return words
+
+
+def progress_records(size, level, seed=0):
+    """Word progress for the bench learner.
+
+    'half' has practiced the first half of the ranks and 'full' every word;
+    of those, 80% are mastered (a quarter of them after a wrong first
+    attempt, so they land in the review pool) and 20% are still active.
+    """
+    if level == 'empty':
+        return {}
+    rng = random.Random(seed)
+    practiced = size // 2 if level == 'half' else size
+    records = {}
+    for i in range(1, practiced + 1):
+        if rng.random() < 0.8:
+            first_correct = rng.random() >= 0.25
+            records[str(i)] = {
+                'times_shown': 3, 'times_correct': 3 if first_correct else 2, 'streak': 3,
+                'mastered': True, 'first_attempt_correct': first_correct,
+            }
+        else:
+            records[str(i)] = {
+                'times_shown': 2, 'times_correct': 1, 'streak': 0,
+                'mastered': False, 'first_attempt_correct': False,
+            }
+    return records
+
+
+def build_fixture(fixtures_dir, size, level):
+    """Create (or reuse) the catalog and progress store for one scenario."""
+    words_file = os.path.join(fixtures_dir, f"words-{size}.json")
+    if not os.path.exists(words_file):
+        with open(words_file, 'w', encoding='utf-8') as f:
+            json.dump({'words': generate_words(size)}, f, ensure_ascii=False)
+
+    progress_dir = os.path.join(fixtures_dir, f"progress-{size}-{level}")
+    if not os.path.exists(progress_dir):
+        sys.path.insert(0, PROJECT_DIR)
+        from progress_store import ProgressStore
+        records = progress_records(size, level)
+        store = ProgressStore(progress_dir)
+        store.apply(
+            BENCH_USER,
+            words=records,
+            practiced=sum(r['times_shown'] for r in records.values()),
+            correct=sum(r['times_correct'] for r in records.values()),
+        )
+    return {
+        'WORDS_FILE': words_file,
+        'PROGRESS_DIR': progress_dir,
+        'PROGRESS_FILE': os.path.join(fixtures_dir, 'no-legacy-progress.json'),
+    }
+
+
+# --- Request plans ---
+
+def request_plan(endpoint, size, rng):
+    """Return a callable producing (method, path, json_body) for each request."""
+    if endpoint == 'check-answer':
+        def plan(state):
+            word_id = rng.randint(1, size)
+            return 'POST', '/api/check-answer', {
+                'word_id': word_id,
+                'answer': f"palabr{word_id:x}o",
+                'strictness': rng.choice(STRICTNESS_LEVELS),
+            }
+        return plan
+    if endpoint == 'next-review-word':
+        def plan(state):
+            session = state.get('session')
+            path = '/api/next-review-word' + (f"?session={session}" if session else '')
+            return 'GET', path, None
+        return plan
+    path = '/api/' + endpoint
+    return lambda state: ('GET', path, None)
+
+
+def remember_session(state, endpoint, body):
+    if endpoint == 'next-review-word':
+        data = json.loads(body)
+        state['session'] = None if data.get('done') else data.get('session_id')
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    n = len(latencies)
+
+    def pct(p):
+        return latencies[min(n - 1, int(p / 100 * n))] * 1000
+
+    return {
+        'requests': n,
+        'rps': round(n / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(pct(50), 3),
+        'p95_ms': round(pct(95), 3),
+        'p99_ms': round(pct(99), 3),
+    }
+
+
+# --- In-process runner ---
+
+def run_inprocess_scenario(size, requests, warmup, endpoints):
+    """Runs inside a fresh interpreter whose environment points at the fixture."""
+    sys.path.insert(0, PROJECT_DIR)
+    import app as app_module
+
+    client = app_module.app.test_client()
+    headers = {'X-User-Id': BENCH_USER, 'Accept-Encoding': 'gzip'}
+    rng = random.Random(1)
+    results = {}
+    for endpoint in endpoints:
+        plan = request_plan(endpoint, size, rng)
+        state = {}
+        latencies = []
+        for i in range(warmup + requests):
+            method, path, body = plan(state)
+            start = time.perf_counter()
+            if method == 'POST':
+                response = client.post(path, json=body, headers=headers)
+            else:
+                response = client.get(path, headers=headers)
+            data = response.get_data()
+            took = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+            remember_session(state, endpoint, data)
+            if i >= warmup:
+                latencies.append(took)
+        results[endpoint] = summarize(latencies, sum(latencies))
+    return results
+
+
+def run_inprocess(env, size, args):
+    cmd = [
+        sys.executable, os.path.abspath(__file__), '--run-scenario',
+        '--requests', str(args.requests), '--warmup', str(args.warmup),
+        '--sizes', str(size), '--endpoints', *args.endpoints,
+    ]
+    out = subprocess.run(
+        cmd, env=dict(os.environ, **env), cwd=args.fixtures, check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+# --- Gunicorn runner ---
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def drive_http(port, endpoint, size, requests, warmup, concurrency):
+    per_thread = max(1, requests // concurrency)
+    latencies = []
+    lock = threading.Lock()
+    errors = []
+    # Everyone finishes warming up before the clock starts
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker(seed):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        plan = request_plan(endpoint, size, random.Random(seed))
+        state = {}
+        mine = []
+        try:
+            for i in range(warmup + per_thread):
+                if i == warmup:
+                    ready.wait()
+                method, path, body = plan(state)
+                payload = json.dumps(body) if body is not None else None
+                headers = {'X-User-Id': BENCH_USER, 'Accept-Encoding': 'gzip'}
+                if payload:
+                    headers['Content-Type'] = 'application/json'
+                start = time.perf_counter()
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                took = time.perf_counter() - start
+                if response.status >= 400:
+                    raise RuntimeError(f"{path} returned {response.status}")
+                if response.getheader('Content-Encoding') != 'gzip':
+                    remember_session(state, endpoint, data)
+                if i >= warmup:
+                    mine.append(took)
+        except Exception as exc:  # reported after the run
+            errors.append(exc)
+            ready.abort()
+        finally:
+            conn.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    for t in threads:
+        t.start()
+    try:
+        ready.wait()
+    except threading.BrokenBarrierError:
+        pass
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return summarize(latencies, elapsed)
+
+
+def run_gunicorn(env, size, args):
+    port = free_port()
+    # An explicit empty config, so gunicorn.conf.py (preload, gc tuning) is not
+    # picked up and results stay comparable with runs made before it existed
+    empty_config = os.path.join(args.fixtures, 'empty.conf.py')
+    open(empty_config, 'w').close()
+    cmd = [
+        sys.executable, '-m', 'gunicorn', '--config', empty_config, '--bind', f"127.0.0.1:{port}",
+        '--workers', str(args.workers), '--threads', str(args.threads),
+        '--log-level', 'warning', 'app:app',
+    ]
+    proc = subprocess.Popen(cmd, cwd=PROJECT_DIR, env=dict(os.environ, **env))
+    try:
+        wait_for_port(port, proc)
+        return {
+            endpoint: drive_http(port, endpoint, size, args.requests, args.warmup, args.concurrency)
+            for endpoint in args.endpoints
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+# --- Reporting ---
+
+def print_results(results):
+    print(f"{'scenario':<34} {'endpoint':<17} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for scenario, endpoints in results.items():
+        for endpoint, r in endpoints.items():
+            print(f"{scenario:<34} {endpoint:<17} {r['rps']:>10} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9}")
+
+
+def compare(results, baseline, threshold):
+    """Print p50/p95 changes against a stored baseline; return the regressions."""
+    regressions = []
+    print(f"\n{'scenario':<34} {'endpoint':<17} {'p50 change':>11} {'p95 change':>11}")
+    for scenario, endpoints in results.items():
+        for endpoint, r in endpoints.items():
+            base = baseline.get(scenario, {}).get(endpoint)
+            if not base:
+                continue
+            changes = []
+            for key in ('p50_ms', 'p95_ms'):
+                change = (r[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+                changes.append(change)
+            print(f"{scenario:<34} {endpoint:<17} {changes[0]:>+10.1f}% {changes[1]:>+10.1f}%")
+            if changes[1] > threshold:
+                regressions.append((scenario, endpoint, changes[1]))
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the vocabulary API endpoints.')
+    parser.add_argument('--mode', choices=('inprocess', 'gunicorn'), default='inprocess')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 50000])
+    parser.add_argument('--progress', nargs='+', choices=PROGRESS_LEVELS, default=list(PROGRESS_LEVELS))
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--fixtures', help='directory to generate and reuse fixtures in')
+    parser.add_argument('--save-baseline', metavar='FILE')
+    parser.add_argument('--compare', metavar='FILE')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='p95 regression (in %%) that makes --compare fail')
+    parser.add_argument('--run-scenario', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+
+    if args.run_scenario:
+        print(json.dumps(run_inprocess_scenario(args.sizes[0], args.requests, args.warmup, args.endpoints)))
+        return
+
+    args.fixtures = args.fixtures or tempfile.mkdtemp(prefix='fq-bench-')
+    os.makedirs(args.fixtures, exist_ok=True)
+    runner = run_gunicorn if args.mode == 'gunicorn' else run_inprocess
+
+    results = {}
+    for size in args.sizes:
+        for level in args.progress:
+            scenario = f"{args.mode}/{size}/{level}"
+            print(f"Running {scenario}...", file=sys.stderr)
+            env = build_fixture(args.fixtures, size, level)
+            results[scenario] = runner(env, size, args)
+
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} endpoint(s) regressed by more than {args.threshold}% at p95")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Compare gunicorn worker memory and startup with and without gunicorn.conf.py
+
+Usage:
+    python scripts/bench_workers.py [--size 50000] [--workers 4]
+
+Starts the app twice against the same generated catalog:
+
+    plain      gunicorn app:app with an empty config (every worker imports
+               the app and builds the catalog and indexes on first use)
+    preloaded  gunicorn with gunicorn.conf.py (built once in the master,
+               gc.freeze() before forking)
+
+For each it reports the time until the first /api/next-word answer, the
+slowest request of a first concurrent burst (a worker's first request pays
+for anything it still has to build), and per-worker RSS, PSS and USS read
+from /proc/<pid>/smaps_rollup after every endpoint has been exercised.
+PSS and USS are what the shared copy-on-write pages save; RSS counts them
+in full for every worker. Linux only.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench import BENCH_USER, PROJECT_DIR, build_fixture, free_port
+
+WARM_PATHS = (
+    ('GET', '/api/next-word', None),
+    ('GET', '/api/words', None),
+    ('GET', '/api/words?level=1', None),
+    ('POST', '/api/check-answer', {'word_id': 1, 'answer': 'palabr1o', 'strictness': 'high'}),
+    ('GET', '/api/next-review-word', None),
+    ('GET', '/api/progress', None),
+)
+
+
+def request(port, method, path, body=None, timeout=120):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        headers = {'X-User-Id': BENCH_USER}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def wait_until_serving(port, proc, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            status, _ = request(port, 'GET', '/api/next-word', timeout=timeout)
+            if status == 200:
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def burst(port, count):
+    """Fire `count` concurrent requests and return the slowest latency."""
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i):
+        method, path, body = WARM_PATHS[i % len(WARM_PATHS)]
+        _, took = request(port, method, path, body)
+        with lock:
+            latencies.append(took)
+
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return max(latencies)
+
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children', encoding='ascii') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def memory_kib(pid):
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup', encoding='ascii') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def run(mode, env, args):
+    port = free_port()
+    cmd = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+           '--log-level', 'warning']
+    if mode == 'plain':
+        cmd += ['--config', args.empty_config, 'app:app']
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=PROJECT_DIR, env=dict(os.environ, **env))
+    try:
+        wait_until_serving(port, proc)
+        startup = time.perf_counter() - started
+        slowest = burst(port, args.workers * 8)
+        for _ in range(args.workers * 4):
+            for method, path, body in WARM_PATHS:
+                request(port, method, path, body)
+        workers = [memory_kib(pid) for pid in worker_pids(proc.pid)]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {
+        'startup_s': round(startup, 3),
+        'first_burst_max_ms': round(slowest * 1000, 1),
+        'worker_rss_mib': round(sum(w['rss'] for w in workers) / len(workers) / 1024, 1),
+        'worker_pss_mib': round(sum(w['pss'] for w in workers) / len(workers) / 1024, 1),
+        'worker_uss_mib': round(sum(w['uss'] for w in workers) / len(workers) / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare plain and preloaded gunicorn workers.')
+    parser.add_argument('--size', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--fixtures', help='directory to generate and reuse fixtures in')
+    args = parser.parse_args(argv)
+
+    args.fixtures = args.fixtures or tempfile.mkdtemp(prefix='fq-bench-')
+    os.makedirs(args.fixtures, exist_ok=True)
+    args.empty_config = os.path.join(args.fixtures, 'empty.conf.py')
+    open(args.empty_config, 'w').close()
+    env = build_fixture(args.fixtures, args.size, 'half')
+    env['ANSWER_LOG_DIR'] = os.path.join(args.fixtures, 'answer_log')
+
+    results = {mode: run(mode, env, args) for mode in ('plain', 'preloaded')}
+    keys = list(results['plain'])
+    print(f"{'mode':<10} " + ' '.join(f'{k:>20}' for k in keys))
+    for mode, r in results.items():
+        print(f'{mode:<10} ' + ' '.join(f'{r[k]:>20}' for k in keys))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Compile words.json into the compact memory-mapped catalog (words.bin)
+
+Usage:
+    python scripts/build_catalog.py [words_file] [--output PATH] [--no-verify]
+
+The output records the sha256 of the source file, so the app only uses it
+while it matches the current words.json and falls back to parsing the JSON
+otherwise. Re-run this after every change to words.json.
+
+Before writing, the compiled file is decoded back and checked to reproduce
+the source exactly (byte for byte when words.json is in its canonical
+2-space indented form). The script then prints how long a cold load takes
+from each format.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from compact_catalog import (  # noqa: E402
+    CompactCatalogFile, compact_path_for, compile_words, source_digest,
+)
+
+# Loads the catalog in a fresh interpreter and prints the seconds taken, or
+# with tracing on the Python heap growth in bytes (the mmap itself is shared
+# page cache, not heap). Imports happen before the measurement.
+LOAD = """
+import os, sys, time, tracemalloc
+sys.path.insert(0, {project!r})
+from catalog import WordCatalog
+catalog = WordCatalog({path!r})
+if not {compact}:
+    catalog.compact_path = os.devnull
+if {trace}:
+    tracemalloc.start()
+start = time.perf_counter()
+catalog.reload()
+elapsed = time.perf_counter() - start
+assert (catalog.compact is not None) == {compact}
+print(tracemalloc.get_traced_memory()[0] if {trace} else elapsed)
+"""
+
+
+def dump_words(data):
+    """Serialize the way words.json is written by the other scripts."""
+    return (json.dumps(data, indent=2, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def verify(path, raw, data):
+    """Decode the compiled file and compare it with the source."""
+    compact = CompactCatalogFile(path)
+    decoded = {'words': [dict(w) for w in compact.words]}
+    if decoded != data:
+        for original, copy in zip(data['words'], decoded['words']):
+            if original != copy:
+                raise SystemExit(f"Round trip changed word {original.get('id')}: {original!r} != {copy!r}")
+        raise SystemExit('Round trip changed the word list')
+    if list(data) != ['words']:
+        print("Note: top-level keys other than 'words' are not stored in the compact file")
+    if dump_words(decoded) == raw:
+        print('Round trip: byte-identical to the source')
+    else:
+        print('Round trip: identical data (source is not in canonical indented form)')
+    for word in data['words']:
+        if compact.by_id[str(word['id'])]['id'] != word['id'] or compact.by_rank[word['rank']]['rank'] != word['rank']:
+            raise SystemExit(f"Index lookup failed for word {word['id']}")
+
+
+def cold_load(words_file, compact):
+    """Best of five fresh interpreters in milliseconds, and the heap growth in bytes."""
+    def run(trace):
+        script = LOAD.format(project=PROJECT_DIR, path=words_file, compact=compact, trace=trace)
+        out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        return float(out.stdout)
+    return min(run(False) for _ in range(5)) * 1000, int(run(True))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile words.json into the compact catalog format.')
+    parser.add_argument('words_file', nargs='?', default=os.path.join(PROJECT_DIR, 'words.json'))
+    parser.add_argument('--output', help='defaults to the words file with a .bin suffix')
+    parser.add_argument('--no-verify', action='store_true', help='skip the round-trip check and timings')
+    args = parser.parse_args(argv)
+
+    output = args.output or compact_path_for(args.words_file)
+    with open(args.words_file, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw)
+    try:
+        compiled = compile_words(data['words'], source_digest(raw))
+    except ValueError as e:
+        raise SystemExit(f"Cannot compile {args.words_file}: {e}")
+
+    tmp = output + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(compiled)
+        f.flush()
+        os.fsync(f.fileno())
+    if not args.no_verify:
+        verify(tmp, raw, data)
+    os.replace(tmp, output)
+    print(f"Wrote {output}: {len(data['words'])} words, {len(compiled):,} bytes (source {len(raw):,} bytes)")
+
+    if not args.no_verify and args.output is None:
+        json_ms, json_heap = cold_load(args.words_file, compact=False)
+        compact_ms, compact_heap = cold_load(args.words_file, compact=True)
+        print(f"Cold load: JSON {json_ms:.1f} ms, {json_heap / 2**20:.1f} MiB heap; "
+              f"compact {compact_ms:.1f} ms, {compact_heap / 2**20:.1f} MiB heap")
+
+
+if __name__ == '__main__':
+    main()
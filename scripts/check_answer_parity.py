@@ -0,0 +1,92 @@
+"""
+Check that the precompiled answer index gives the same verdicts as check_answer_match
+
+Usage:
+    python scripts/check_answer_parity.py [words_file]
+
+For every word and every strictness level this tries the accepted answers
+plus a set of near variants (article added or swapped, accents stripped,
+case and whitespace changes, typos, other words' answers) and compares the
+AnswerIndex verdict, with typos looked up in the NearMissIndex, against the
+original linear check_answer_match.
+Exits with status 1 if any verdict differs.
+"""
+
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from answers import (  # noqa: E402
+    build_answer_index, build_near_miss_index, check_answer_match, remove_accents,
+)
+from catalog import WordCatalog  # noqa: E402
+
+STRICTNESS_LEVELS = ('high', 'medium', 'low', 'unknown')
+
+
+def candidate_answers(word, neighbour):
+    """Answers worth probing for one word."""
+    candidates = ['', ' ', 'xyz']
+    for ans in word['spanish']:
+        candidates += [
+            ans,
+            ans.upper(),
+            f"  {ans}  ",
+            remove_accents(ans),
+            remove_accents(ans).upper(),
+            f"el {ans}",
+            f"la {ans}",
+            f"los {ans}",
+            f"el {remove_accents(ans)}",
+            f"la {remove_accents(ans)}",
+            f"{ans}s",
+            ans[:-1],
+            ans[1:],
+            ans[:2] + ans[1:],
+            ans[:1] + 'x' + ans[2:],
+            ans[1:2] + ans[:1] + ans[2:],
+            ans[:-2] + ans[-1:] + ans[-2:-1],
+            ans[:1] + 'xy' + ans[3:],
+            f"la {ans[:-1]}",
+        ]
+        if word.get('article'):
+            candidates.append(f"{word['article'].upper()} {ans.title()}")
+            candidates.append(f"{word['article']}  {ans}")
+    candidates += neighbour['spanish']
+    return candidates
+
+
+def main():
+    words_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(PROJECT_DIR, 'words.json')
+    catalog = WordCatalog(words_file).reload()
+    index = build_answer_index(catalog)
+    near_misses = build_near_miss_index(catalog)
+    words = catalog.words
+
+    checked = 0
+    mismatches = []
+    for i, word in enumerate(words):
+        neighbour = words[(i + 1) % len(words)]
+        entry = index[str(word['id'])]
+        for answer in candidate_answers(word, neighbour):
+            for strictness in STRICTNESS_LEVELS:
+                expected = check_answer_match(answer, word['spanish'], strictness, word)
+                actual = entry.match(answer, strictness, near_misses)
+                checked += 1
+                if expected != actual:
+                    mismatches.append((word['id'], answer, strictness, expected, actual))
+
+    print(f"Checked {checked} verdicts across {len(words)} words.")
+    if mismatches:
+        print(f"{len(mismatches)} mismatches:")
+        for word_id, answer, strictness, expected, actual in mismatches[:20]:
+            print(f"  word {word_id} {answer!r} [{strictness}]: expected {expected}, got {actual}")
+        sys.exit(1)
+    print("All verdicts match.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import heapq
+from bisect import bisect_left
+
+from answers import gloss_answers, normalize_gloss
+
+# A prefix whose key range is wider than this is answered from the range
+# minimum table instead of scanning the range
+MAX_RANGE_SCAN = 2048
+
+# Entries per block of the range minimum table
+RANGE_MIN_BLOCK = 32
+
+
+def search_keys(word):
+    """Accent-folded keys a word can be found under: every English gloss
+    alternative and Spanish form, and each word inside them."""
+    phrases = set(gloss_answers(word['english']))
+    phrases.update(normalize_gloss(form) for form in word['spanish'])
+    keys = set()
+    for phrase in phrases:
+        if phrase:
+            keys.add(phrase)
+            keys.update(phrase.split())
+    return keys
+
+
+class SearchIndex:
+    """Prefix search over the catalog, built once per catalog version.
+
+    Every (key, word) pair sits in one sorted array, so the keys starting
+    with a prefix are a contiguous range found with two bisects. A narrow
+    range is scanned for its best-ranked words. A wide range is searched
+    with a range minimum table over the positions, which hands out its
+    best-ranked words one at a time. Neither path depends on the catalog
+    size beyond the bisects, nor on how rare or common the matches are.
+    """
+
+    def __init__(self, catalog):
+        words = sorted(catalog.words, key=lambda w: w['rank'])
+        self.word_ids = [str(w['id']) for w in words]
+        entries = []
+        for position, word in enumerate(words):
+            entries.extend((key, position) for key in search_keys(word))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.positions = [position for _, position in entries]
+        self.range_min = RangeMin(self.positions)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(self, query, limit=10):
+        """Ids of the best-ranked words with a key starting with `query`."""
+        prefix = normalize_gloss(query)
+        if not prefix or limit < 1:
+            return []
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        if hi - lo <= MAX_RANGE_SCAN:
+            best = heapq.nsmallest(limit, set(self.positions[lo:hi]))
+        else:
+            best = self.range_min.smallest(lo, hi, limit)
+        return [self.word_ids[position] for position in best]
+
+
+class RangeMin:
+    """Smallest values of any slice of `values`, without scanning the slice.
+
+    A sparse table holds the minimum of every power-of-two run of
+    fixed-size blocks, so the whole blocks inside a slice take two lookups
+    and only the partial blocks at its ends are scanned.
+    """
+
+    def __init__(self, values, block=RANGE_MIN_BLOCK):
+        self.values = values
+        self.block = block
+        # Level j holds, for each block, the index of the minimum over 2**j blocks from it
+        level = [values.index(min(values[i:i + block]), i) for i in range(0, len(values), block)]
+        self.table = [level]
+        span = 1
+        while 2 * span <= len(level):
+            level = [a if values[a] <= values[b] else b for a, b in zip(level, level[span:])]
+            self.table.append(level)
+            span *= 2
+
+    def argmin(self, lo, hi):
+        """Index of the smallest value in values[lo:hi] (lo < hi)."""
+        values, block = self.values, self.block
+        first, last = -(-lo // block), hi // block
+        if first >= last:
+            return values.index(min(values[lo:hi]), lo)
+        candidates = []
+        if lo < first * block:
+            candidates.append(values.index(min(values[lo:first * block]), lo))
+        if last * block < hi:
+            candidates.append(values.index(min(values[last * block:hi]), last * block))
+        depth = (last - first).bit_length() - 1
+        row = self.table[depth]
+        candidates += (row[first], row[last - (1 << depth)])
+        return min(candidates, key=values.__getitem__)
+
+    def smallest(self, lo, hi, limit):
+        """Up to `limit` distinct smallest values in values[lo:hi], ascending."""
+        values = self.values
+        index = self.argmin(lo, hi)
+        heap = [(values[index], index, lo, hi)]
+        best = []
+        while heap and len(best) < limit:
+            value, index, lo, hi = heapq.heappop(heap)
+            # A word has several keys, so it can turn up more than once
+            if not best or best[-1] != value:
+                best.append(value)
+            for sub_lo, sub_hi in ((lo, index), (index + 1, hi)):
+                if sub_lo < sub_hi:
+                    sub_index = self.argmin(sub_lo, sub_hi)
+                    heapq.heappush(heap, (values[sub_index], sub_index, sub_lo, sub_hi))
+        return best
+
+
+def build_search_index(catalog):
+    return SearchIndex(catalog)
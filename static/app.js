@@ -3,14 +3,35 @@ let currentWord = null;
 let isAnswered = false;
 let autoAdvanceTimeout = null;
 let reviewMode = false;
-let reviewedWordIds = [];
+let reviewQueue = null;
 let currentStrictness = 'medium';
 let currentTheme = 'default';
+let currentScheduling = 'mastery';
+let currentDirection = 'forward';
 let currentLevel = 1;
-let allWords = [];
+let levelWords = {};
 let localProgress = null;
-
-const STORAGE_KEY = 'fearless_quail_progress';
+let pendingAnswers = [];
+let isFlushing = false;
+let syncStates = {};
+let isSyncing = false;
+let syncTimeout = null;
+
+// The deck comes from the page URL (/?deck=name) so that this page never
+// follows a deck setting changed elsewhere; anything but the default deck
+// keeps its progress under its own storage keys.
+const DEFAULT_DECK = 'es';
+const DECK = new URLSearchParams(window.location.search).get('deck') || DEFAULT_DECK;
+const DECK_SUFFIX = DECK === DEFAULT_DECK ? '' : `_${DECK}`;
+const STORAGE_KEY = `fearless_quail_progress${DECK_SUFFIX}`;
+const PENDING_KEY = `fearless_quail_pending_answers${DECK_SUFFIX}`;
+const SYNC_KEY = `fearless_quail_sync${DECK_SUFFIX}`;
+const MAX_BATCH_ANSWERS = 500;
+const MAX_SYNC_WORDS = 5000;
+const SYNC_DELAY_MS = 3000;
+// 'forward' is English -> Spanish, 'reverse' is Spanish -> English; each
+// direction has its own progress, selection index and sync state.
+const DIRECTIONS = ['forward', 'reverse'];
 
 // DOM Elements
 const englishWordEl = document.getElementById('english-word');
@@ -41,8 +62,13 @@ const exitReviewBtn = document.getElementById('exit-review-btn');
 const strictnessHighBtn = document.getElementById('btn-strictness-high');
 const strictnessMediumBtn = document.getElementById('btn-strictness-medium');
 const strictnessLowBtn = document.getElementById('btn-strictness-low');
+const schedulingMasteryBtn = document.getElementById('btn-scheduling-mastery');
+const schedulingSpacedBtn = document.getElementById('btn-scheduling-sm2');
+const directionForwardBtn = document.getElementById('btn-direction-forward');
+const directionReverseBtn = document.getElementById('btn-direction-reverse');
 const accentMissNoteEl = document.getElementById('accent-miss-note');
 const articleMissNoteEl = document.getElementById('article-miss-note');
+const nearMissNoteEl = document.getElementById('near-miss-note');
 const themeOpenBtn = document.getElementById('theme-open-btn');
 const themeModalOverlay = document.getElementById('theme-modal-overlay');
 const themeModalClose = document.getElementById('theme-modal-close');
@@ -52,6 +78,8 @@ const levelBtns = document.querySelectorAll('.level-option');
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
     initProgress();
+    initPendingAnswers();
+    initSyncState();
     loadWordsAndStart();
     loadSettings();
     setupEventListeners();
@@ -79,7 +107,10 @@ function initProgress() {
         };
     }
     if (!localProgress.settings) localProgress.settings = {};
+    if (!localProgress.reverse_word_progress) localProgress.reverse_word_progress = {};
+    if (!localProgress.reverse_stats) localProgress.reverse_stats = { total_practiced: 0, total_correct: 0 };
     currentLevel = localProgress.settings.level || 1;
+    currentDirection = localProgress.settings.direction || 'forward';
     currentTheme = localProgress.settings.theme || 'default';
     applyTheme(currentTheme);
 }
@@ -89,18 +120,206 @@ function saveLocalProgress() {
     localStorage.setItem(STORAGE_KEY, JSON.stringify(localProgress));
 }
 
+// --- Offline answer queue ---
+
+function initPendingAnswers() {
+    try {
+        pendingAnswers = JSON.parse(localStorage.getItem(PENDING_KEY)) || [];
+    } catch (e) {
+        pendingAnswers = [];
+    }
+}
+
+function savePendingAnswers() {
+    if (pendingAnswers.length) {
+        localStorage.setItem(PENDING_KEY, JSON.stringify(pendingAnswers));
+    } else {
+        localStorage.removeItem(PENDING_KEY);
+    }
+}
+
+function queueAnswer(wordId, answer, strictness, direction) {
+    pendingAnswers.push({ word_id: wordId, answer, strictness, direction });
+    savePendingAnswers();
+}
+
+// Grade every queued answer with one request and fold the verdicts into local progress.
+async function flushPendingAnswers() {
+    if (isFlushing || !pendingAnswers.length) return;
+    isFlushing = true;
+    try {
+        while (pendingAnswers.length) {
+            const batch = pendingAnswers.slice(0, MAX_BATCH_ANSWERS);
+            const response = await fetch('/api/check-answers', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ deck: DECK, answers: batch })
+            });
+            if (!response.ok) break;
+            const data = await response.json();
+            data.results.forEach((result, i) => {
+                if (!result.error) recordAnswer(String(batch[i].word_id), result.correct, batch[i].direction || 'forward');
+            });
+            pendingAnswers = pendingAnswers.slice(batch.length);
+            savePendingAnswers();
+        }
+        displayProgress();
+    } catch (error) {
+        // Still offline; keep the queue for the next attempt
+    } finally {
+        isFlushing = false;
+    }
+}
+
+// --- Sync with the server ---
+
+function progressFor(direction) {
+    return direction === 'reverse' ? localProgress.reverse_word_progress : localProgress.word_progress;
+}
+
+function statsFor(direction) {
+    return direction === 'reverse' ? localProgress.reverse_stats : localProgress.user_stats;
+}
+
+// Only word records changed since the last acknowledged server version are
+// sent, along with the answer counts made since then; the server replies
+// with the records other devices changed. Newer 'updated_at' wins.
+function syncKey(direction) {
+    return direction === 'reverse' ? `${SYNC_KEY}_reverse` : SYNC_KEY;
+}
+
+function initSyncState() {
+    for (const direction of DIRECTIONS) {
+        let state = null;
+        try {
+            state = JSON.parse(localStorage.getItem(syncKey(direction)));
+        } catch (e) {
+            state = null;
+        }
+        if (!state) {
+            // Anything already stored locally has never been sent
+            const dirty = {};
+            for (const wordId of Object.keys(progressFor(direction))) dirty[wordId] = true;
+            state = { version: 0, dirty, practiced: 0, correct: 0 };
+        }
+        syncStates[direction] = state;
+    }
+}
+
+function saveSyncState(direction) {
+    localStorage.setItem(syncKey(direction), JSON.stringify(syncStates[direction]));
+}
+
+function scheduleSync() {
+    if (syncTimeout) clearTimeout(syncTimeout);
+    syncTimeout = setTimeout(syncProgress, SYNC_DELAY_MS);
+}
+
+async function syncProgress() {
+    if (syncTimeout) {
+        clearTimeout(syncTimeout);
+        syncTimeout = null;
+    }
+    if (isSyncing) return;
+    isSyncing = true;
+    try {
+        for (const direction of DIRECTIONS) await syncDirection(direction);
+        displayProgress();
+    } catch (error) {
+        // Offline; the changes stay marked for the next attempt
+    } finally {
+        isSyncing = false;
+    }
+}
+
+async function syncDirection(direction) {
+    let more = true;
+    while (more) {
+        const syncState = syncStates[direction];
+        const wp = progressFor(direction);
+        const sentIds = Object.keys(syncState.dirty).slice(0, MAX_SYNC_WORDS);
+        const changes = {};
+        const sentAt = {};
+        for (const wordId of sentIds) {
+            if (!wp[wordId]) continue;
+            changes[wordId] = wp[wordId];
+            sentAt[wordId] = wp[wordId].updated_at;
+        }
+        const sent = { practiced: syncState.practiced, correct: syncState.correct };
+        const response = await fetch('/api/sync', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ deck: DECK, since: syncState.version, direction, changes, ...sent })
+        });
+        if (!response.ok) return;
+        const data = await response.json();
+
+        if (data.reset) {
+            // Progress was reset on another device; start again from the server's copy
+            if (direction === 'reverse') localProgress.reverse_word_progress = {};
+            else localProgress.word_progress = {};
+            syncStates[direction] = { version: 0, dirty: {}, practiced: 0, correct: 0 };
+            if (selectionIndex && selectionIndex.direction === direction) selectionIndex = null;
+        } else {
+            for (const wordId of sentIds) {
+                // Answered again while the request was in flight: keep it for the next sync
+                if (!wp[wordId] || wp[wordId].updated_at === sentAt[wordId]) delete syncState.dirty[wordId];
+            }
+            syncState.practiced -= sent.practiced;
+            syncState.correct -= sent.correct;
+        }
+        const current = syncStates[direction];
+        applyRemoteChanges(direction, data.changes);
+        const stats = statsFor(direction);
+        stats.total_practiced = data.user_stats.total_practiced + current.practiced;
+        stats.total_correct = data.user_stats.total_correct + current.correct;
+        current.version = data.version;
+        saveSyncState(direction);
+        saveLocalProgress();
+        more = Object.keys(current.dirty).length > 0 && sentIds.length === MAX_SYNC_WORDS;
+    }
+}
+
+function applyRemoteChanges(direction, changes) {
+    const wp = progressFor(direction);
+    const dirty = syncStates[direction].dirty;
+    const indexed = selectionIndex && selectionIndex.direction === direction;
+    for (const [wordId, record] of Object.entries(changes)) {
+        const local = wp[wordId];
+        if (local && dirty[wordId] && (local.updated_at || 0) > (record.updated_at || 0)) continue;
+        wp[wordId] = record;
+        delete dirty[wordId];
+        if (indexed) updateSelectionIndex(wordId, record);
+    }
+}
+
 // --- Level helpers ---
 
 function getLevelRange(level) {
     return { min: (level - 1) * 1000 + 1, max: level * 1000 };
 }
 
+function levelKey(level, direction) {
+    return `${direction}:${level}`;
+}
+
 function getLevelWords() {
-    const { min, max } = getLevelRange(currentLevel);
-    return allWords.filter(w => w.rank >= min && w.rank <= max);
+    return levelWords[levelKey(currentLevel, currentDirection)] || [];
+}
+
+// Each level's words are fetched once per direction; the browser revalidates with the ETag.
+async function loadLevelWords(level) {
+    const key = levelKey(level, currentDirection);
+    if (levelWords[key]) return;
+    const response = await fetch(`/api/words?deck=${encodeURIComponent(DECK)}&level=${level}&direction=${currentDirection}`);
+    const data = await response.json();
+    levelWords[key] = data.words;
+    if (selectionIndex && selectionIndex.level === level && selectionIndex.direction === currentDirection) {
+        selectionIndex = null;
+    }
 }
 
-function setLevel(level) {
+async function setLevel(level) {
     currentLevel = level;
     localProgress.settings.level = level;
     saveLocalProgress();
@@ -108,9 +327,14 @@ function setLevel(level) {
     // Exit review mode when switching levels
     if (reviewMode) {
         reviewMode = false;
-        reviewedWordIds = [];
+        reviewQueue = null;
         reviewModeIndicator.style.display = 'none';
     }
+    try {
+        await loadLevelWords(level);
+    } catch (error) {
+        console.error('Error loading words:', error);
+    }
     displayProgress();
     loadNextWord();
 }
@@ -135,67 +359,256 @@ function isMastered(wp) {
     return false;
 }
 
+// SM-2 review intervals. They are kept up to date on every answer so the
+// 'Spaced' schedule can be switched on at any time; the mastery rules above
+// still decide what counts as mastered.
+const DAY_SECONDS = 86400;
+const RELEARN_SECONDS = 60;
+
+function scheduleReview(wp, correct) {
+    const quality = correct ? 4 : 1;
+    wp.ease = Math.max(1.3, (wp.ease || 2.5) + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02));
+    const now = Date.now() / 1000;
+    if (correct) {
+        wp.reps = (wp.reps || 0) + 1;
+        if (wp.reps === 1) wp.interval = 1;
+        else if (wp.reps === 2) wp.interval = 6;
+        else wp.interval = Math.round((wp.interval || 1) * wp.ease);
+        wp.due = now + wp.interval * DAY_SECONDS;
+    } else {
+        wp.reps = 0;
+        wp.interval = 0;
+        wp.due = now + RELEARN_SECONDS;
+    }
+}
+
 // --- Word selection ---
 
-function selectNextWord() {
-    const levelWords = getLevelWords();
-    const wp = localProgress.word_progress;
-    const active = [], newWords = [], review = [];
-
-    for (const word of levelWords) {
-        const wordWp = wp[String(word.id)] || {};
-        if (wordWp.mastered) {
-            if (wordWp.first_attempt_correct === false) review.push(word);
-            continue;
-        }
-        if ((wordWp.times_shown || 0) > 0) active.push(word);
-        else newWords.push(word);
+// Incremental selection index for the current level: unseen words in rank
+// order behind a cursor, active and review words in pools that support O(1)
+// add/remove/random pick. Updated by recordAnswer() instead of rescanning.
+let selectionIndex = null;
+
+function createPool() {
+    return { items: [], positions: new Map() };
+}
+
+function poolAdd(pool, word) {
+    if (pool.positions.has(word.id)) return;
+    pool.positions.set(word.id, pool.items.length);
+    pool.items.push(word);
+}
+
+function poolRemove(pool, word) {
+    const pos = pool.positions.get(word.id);
+    if (pos === undefined) return;
+    pool.positions.delete(word.id);
+    const last = pool.items.pop();
+    if (pos < pool.items.length) {
+        pool.items[pos] = last;
+        pool.positions.set(last.id, pos);
     }
+}
 
-    if (!active.length && !newWords.length) return null;
+function poolPick(pool) {
+    return pool.items[Math.floor(Math.random() * pool.items.length)];
+}
 
-    if (review.length && Math.random() < 0.05) {
-        return review[Math.floor(Math.random() * review.length)];
+// Binary min-heap of [due, wordId] entries
+function heapPush(heap, entry) {
+    let i = heap.length;
+    heap.push(entry);
+    while (i > 0) {
+        const parent = (i - 1) >> 1;
+        if (heap[parent][0] <= entry[0]) break;
+        heap[i] = heap[parent];
+        i = parent;
     }
-    if (active.length && newWords.length) {
-        if (Math.random() < 0.2) return active[Math.floor(Math.random() * active.length)];
-        newWords.sort((a, b) => a.rank - b.rank);
-        return newWords[0];
+    heap[i] = entry;
+}
+
+function heapPop(heap) {
+    const top = heap[0];
+    const last = heap.pop();
+    if (heap.length) {
+        let i = 0;
+        for (;;) {
+            let child = 2 * i + 1;
+            if (child >= heap.length) break;
+            if (child + 1 < heap.length && heap[child + 1][0] < heap[child][0]) child++;
+            if (heap[child][0] >= last[0]) break;
+            heap[i] = heap[child];
+            i = child;
+        }
+        heap[i] = last;
     }
-    if (active.length) return active[Math.floor(Math.random() * active.length)];
-    newWords.sort((a, b) => a.rank - b.rank);
-    return newWords[0];
+    return top;
 }
 
-function selectNextReviewWord(excludeIds) {
-    const levelWords = getLevelWords();
-    const wp = localProgress.word_progress;
-    const excludeSet = new Set(excludeIds.map(String));
-    const active = [];
+function wordState(wordWp) {
+    if (wordWp.mastered) return wordWp.first_attempt_correct === false ? 'review' : 'mastered';
+    return (wordWp.times_shown || 0) > 0 ? 'active' : 'new';
+}
 
-    for (const word of levelWords) {
+function buildSelectionIndex() {
+    const wp = progressFor(currentDirection);
+    const index = {
+        level: currentLevel,
+        direction: currentDirection,
+        words: {},
+        states: {},
+        newWords: [],
+        cursor: 0,
+        active: createPool(),
+        review: createPool(),
+        due: {},
+        dueHeap: [],
+        // Summary counts for displayProgress(), kept in step by updateSelectionIndex()
+        counts: { new: 0, active: 0, review: 0, mastered: 0 },
+        tallies: {},
+        practiced: 0,
+        correct: 0
+    };
+    for (const word of getLevelWords()) {
         const wordId = String(word.id);
-        if (excludeSet.has(wordId)) continue;
-        const wordWp = wp[wordId] || {};
-        if (!wordWp.mastered && (wordWp.times_shown || 0) > 0) {
-            active.push(word);
+        const state = wordState(wp[wordId] || {});
+        index.words[wordId] = word;
+        index.states[wordId] = state;
+        index.counts[state]++;
+        tallyWord(index, wordId, wp[wordId] || {});
+        if (state === 'new') index.newWords.push(word);
+        else if (state === 'active') poolAdd(index.active, word);
+        else if (state === 'review') poolAdd(index.review, word);
+        if (state !== 'new') {
+            index.due[wordId] = wp[wordId].due || 0;
+            index.dueHeap.push([index.due[wordId], wordId]);
         }
     }
+    index.newWords.sort((a, b) => a.rank - b.rank);
+    // A sorted array is already a valid heap
+    index.dueHeap.sort((a, b) => a[0] - b[0]);
+    return index;
+}
+
+// Remember what each word last added to the level's answer totals so a
+// record that was changed in place can be re-tallied by difference.
+function tallyWord(index, wordId, wordWp) {
+    const [shown, correct] = index.tallies[wordId] || [0, 0];
+    const nowShown = wordWp.times_shown || 0;
+    const nowCorrect = wordWp.times_correct || 0;
+    index.practiced += nowShown - shown;
+    index.correct += nowCorrect - correct;
+    index.tallies[wordId] = [nowShown, nowCorrect];
+}
+
+function getSelectionIndex() {
+    if (!selectionIndex || selectionIndex.level !== currentLevel || selectionIndex.direction !== currentDirection) {
+        selectionIndex = buildSelectionIndex();
+    }
+    return selectionIndex;
+}
+
+function updateSelectionIndex(wordId, wordWp) {
+    const index = selectionIndex;
+    if (!index || !index.words[wordId]) return;
+    const word = index.words[wordId];
+    const oldState = index.states[wordId];
+    const newState = wordState(wordWp);
+    const due = wordWp.due || 0;
+    tallyWord(index, wordId, wordWp);
+    if (newState !== 'new' && index.due[wordId] !== due) {
+        // The old heap entry goes stale and is skipped when it surfaces
+        index.due[wordId] = due;
+        heapPush(index.dueHeap, [due, wordId]);
+    }
+    if (oldState === newState) return;
+    index.states[wordId] = newState;
+    index.counts[oldState]--;
+    index.counts[newState]++;
+    if (oldState === 'active') poolRemove(index.active, word);
+    else if (oldState === 'review') poolRemove(index.review, word);
+    if (newState === 'active') poolAdd(index.active, word);
+    else if (newState === 'review') poolAdd(index.review, word);
+}
+
+function nextNewWord(index) {
+    // Words only ever leave the 'new' state, so the cursor never moves back
+    while (index.cursor < index.newWords.length &&
+           index.states[String(index.newWords[index.cursor].id)] !== 'new') {
+        index.cursor++;
+    }
+    return index.newWords[index.cursor] || null;
+}
 
-    if (!active.length) return null;
-    return { word: active[Math.floor(Math.random() * active.length)], remaining: active.length };
+function nextDueEntry(index) {
+    const heap = index.dueHeap;
+    while (heap.length && index.due[heap[0][1]] !== heap[0][0]) heapPop(heap);
+    return heap[0] || null;
+}
+
+// Spaced schedule: the most overdue word first, then new words by rank, and
+// once everything has been seen the word that is due soonest.
+function selectScheduledWord(index) {
+    const top = nextDueEntry(index);
+    if (top && top[0] <= Date.now() / 1000) return index.words[top[1]];
+    const newWord = nextNewWord(index);
+    if (newWord) return newWord;
+    return top ? index.words[top[1]] : null;
+}
+
+function selectNextWord() {
+    const index = getSelectionIndex();
+    if (currentScheduling === 'sm2') return selectScheduledWord(index);
+    const newWord = nextNewWord(index);
+    const hasActive = index.active.items.length > 0;
+
+    if (!hasActive && !newWord) return null;
+
+    if (index.review.items.length && Math.random() < 0.05) {
+        return poolPick(index.review);
+    }
+    if (hasActive && newWord) {
+        if (Math.random() < 0.2) return poolPick(index.active);
+        return newWord;
+    }
+    if (hasActive) return poolPick(index.active);
+    return newWord;
+}
+
+// Review mode shuffles the active words once and walks them with a cursor,
+// skipping any that were mastered since the session started.
+function startReviewQueue() {
+    const items = getSelectionIndex().active.items.slice();
+    for (let i = items.length - 1; i > 0; i--) {
+        const j = Math.floor(Math.random() * (i + 1));
+        [items[i], items[j]] = [items[j], items[i]];
+    }
+    reviewQueue = { items, cursor: 0 };
+}
+
+function selectNextReviewWord() {
+    const index = getSelectionIndex();
+    const queue = reviewQueue;
+    while (queue.cursor < queue.items.length) {
+        const word = queue.items[queue.cursor++];
+        if (index.states[String(word.id)] === 'active') {
+            return { word, remaining: queue.items.length - queue.cursor + 1 };
+        }
+    }
+    return null;
 }
 
 // --- Startup ---
 
 async function loadWordsAndStart() {
     try {
-        const response = await fetch('/api/words');
-        const data = await response.json();
-        allWords = data.words;
+        await loadLevelWords(currentLevel);
         updateLevelUI();
+        updateDirectionUI();
         displayProgress();
         loadNextWord();
+        flushPendingAnswers();
+        syncProgress();
     } catch (error) {
         console.error('Error loading words:', error);
         englishWordEl.textContent = 'Error loading words. Please refresh.';
@@ -203,6 +616,8 @@ async function loadWordsAndStart() {
 }
 
 function setupEventListeners() {
+    window.addEventListener('online', flushPendingAnswers);
+    window.addEventListener('online', syncProgress);
     submitBtn.addEventListener('click', checkAnswer);
     nextBtn.addEventListener('click', loadNextWord);
     resetBtn.addEventListener('click', resetProgress);
@@ -215,6 +630,10 @@ function setupEventListeners() {
     strictnessHighBtn.addEventListener('click', () => setStrictness('high'));
     strictnessMediumBtn.addEventListener('click', () => setStrictness('medium'));
     strictnessLowBtn.addEventListener('click', () => setStrictness('low'));
+    schedulingMasteryBtn.addEventListener('click', () => setScheduling('mastery'));
+    schedulingSpacedBtn.addEventListener('click', () => setScheduling('sm2'));
+    directionForwardBtn.addEventListener('click', () => setDirection('forward'));
+    directionReverseBtn.addEventListener('click', () => setDirection('reverse'));
 
     levelBtns.forEach(btn => {
         btn.addEventListener('click', () => setLevel(Number(btn.dataset.level)));
@@ -274,6 +693,7 @@ async function loadNextWord() {
     feedbackEl.classList.remove('correct', 'incorrect', 'show');
     accentMissNoteEl.style.display = 'none';
     articleMissNoteEl.style.display = 'none';
+    nearMissNoteEl.style.display = 'none';
     answerInput.value = '';
     answerInput.disabled = false;
     submitBtn.style.display = 'inline-block';
@@ -281,17 +701,16 @@ async function loadNextWord() {
     flashcardEl.style.display = 'block';
     completionEl.style.display = 'none';
 
-    if (!allWords.length) return;
+    if (!getLevelWords().length) return;
 
     let selected;
     if (reviewMode) {
-        const result = selectNextReviewWord(reviewedWordIds);
+        const result = selectNextReviewWord();
         if (!result) {
             exitReviewMode();
             return;
         }
         selected = result.word;
-        reviewedWordIds.push(String(selected.id));
         const remaining = result.remaining - 1;
         reviewRemainingEl.textContent = `${remaining} word${remaining !== 1 ? 's' : ''} remaining`;
     } else {
@@ -303,10 +722,13 @@ async function loadNextWord() {
     }
 
     currentWord = selected;
-    englishWordEl.textContent = currentWord.english;
+    // Reverse-mode cards carry the Spanish prompt instead of the English gloss
+    englishWordEl.textContent = currentDirection === 'reverse' ? currentWord.prompt : currentWord.english;
 
     // Update placeholder hint for high strictness nouns
-    if (currentStrictness === 'high' && currentWord.category === 'noun' && currentWord.article) {
+    if (currentDirection === 'reverse') {
+        answerInput.placeholder = 'Type English translation...';
+    } else if (currentStrictness === 'high' && currentWord.category === 'noun' && currentWord.article) {
         answerInput.placeholder = `Type "${currentWord.article} ..."`;
     } else {
         answerInput.placeholder = 'Type Spanish translation...';
@@ -318,49 +740,88 @@ async function loadNextWord() {
     }, 50);
 }
 
+function recordAnswer(wordId, correct, direction = currentDirection) {
+    const progress = progressFor(direction);
+    const wp = progress[wordId] || {
+        times_shown: 0,
+        times_correct: 0,
+        streak: 0,
+        mastered: false,
+        first_attempt_correct: null
+    };
+
+    if (wp.times_shown === 0) wp.first_attempt_correct = correct;
+    wp.times_shown += 1;
+    if (correct) {
+        wp.times_correct += 1;
+        wp.streak += 1;
+    } else {
+        wp.streak = 0;
+    }
+    wp.mastered = isMastered(wp);
+    scheduleReview(wp, correct);
+    wp.updated_at = Date.now() / 1000;
+
+    progress[wordId] = wp;
+    if (selectionIndex && selectionIndex.direction === direction) updateSelectionIndex(wordId, wp);
+    const stats = statsFor(direction);
+    stats.total_practiced += 1;
+    if (correct) stats.total_correct += 1;
+    saveLocalProgress();
+    const syncState = syncStates[direction];
+    syncState.dirty[wordId] = true;
+    syncState.practiced += 1;
+    if (correct) syncState.correct += 1;
+    saveSyncState(direction);
+    scheduleSync();
+    return wp;
+}
+
+function showQueuedFeedback() {
+    isAnswered = true;
+    feedbackEl.style.display = 'block';
+    feedbackEl.classList.add('show');
+    answerInput.disabled = true;
+    submitBtn.style.display = 'none';
+    feedbackIcon.textContent = '⏳';
+    feedbackText.textContent = "You're offline — your answer is saved and will be checked when you reconnect.";
+    accentMissNoteEl.style.display = 'none';
+    articleMissNoteEl.style.display = 'none';
+    nearMissNoteEl.style.display = 'none';
+    correctAnswersEl.innerHTML = '';
+    nextBtn.focus();
+}
+
 async function checkAnswer() {
     const userAnswer = answerInput.value.trim();
     if (!userAnswer) { answerInput.focus(); return; }
     if (!currentWord) return;
 
+    let data;
     try {
         const response = await fetch('/api/check-answer', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
+                deck: DECK,
                 word_id: currentWord.id,
                 answer: userAnswer,
-                strictness: currentStrictness
+                strictness: currentStrictness,
+                direction: currentDirection
             })
         });
+        data = await response.json();
+    } catch (error) {
+        queueAnswer(currentWord.id, userAnswer, currentStrictness, currentDirection);
+        showQueuedFeedback();
+        return;
+    }
 
-        const data = await response.json();
+    try {
         isAnswered = true;
 
         // Update local progress
-        const wordId = String(currentWord.id);
-        const wp = localProgress.word_progress[wordId] || {
-            times_shown: 0,
-            times_correct: 0,
-            streak: 0,
-            mastered: false,
-            first_attempt_correct: null
-        };
-
-        if (wp.times_shown === 0) wp.first_attempt_correct = data.correct;
-        wp.times_shown += 1;
-        if (data.correct) {
-            wp.times_correct += 1;
-            wp.streak += 1;
-        } else {
-            wp.streak = 0;
-        }
-        wp.mastered = isMastered(wp);
-
-        localProgress.word_progress[wordId] = wp;
-        localProgress.user_stats.total_practiced += 1;
-        if (data.correct) localProgress.user_stats.total_correct += 1;
-        saveLocalProgress();
+        const wp = recordAnswer(String(currentWord.id), data.correct);
 
         // Show feedback
         feedbackEl.style.display = 'block';
@@ -392,6 +853,7 @@ async function checkAnswer() {
                 accentMissNoteEl.style.display = 'none';
             }
             articleMissNoteEl.style.display = 'none';
+            nearMissNoteEl.style.display = 'none';
 
             const otherAnswers = data.valid_answers.filter(
                 a => a.toLowerCase() !== userAnswer.toLowerCase()
@@ -422,10 +884,17 @@ async function checkAnswer() {
                     `Don't forget the article! High Strictness requires "el" or "la" before nouns. Correct: "${data.valid_answers[0]}"`;
                 articleMissNoteEl.style.display = 'block';
             } else {
-                feedbackText.textContent = 'Not quite right';
+                feedbackText.textContent = data.near_miss ? 'Almost!' : 'Not quite right';
                 articleMissNoteEl.style.display = 'none';
             }
 
+            if (data.near_miss) {
+                nearMissNoteEl.textContent = 'So close — just a typo away. Check the spelling below.';
+                nearMissNoteEl.style.display = 'block';
+            } else {
+                nearMissNoteEl.style.display = 'none';
+            }
+
             correctAnswersEl.innerHTML = '<strong>Correct answers:</strong>';
             data.valid_answers.forEach(answer => {
                 const span = document.createElement('span');
@@ -436,41 +905,32 @@ async function checkAnswer() {
 
         displayProgress();
         nextBtn.focus();
+        flushPendingAnswers();
     } catch (error) {
         console.error('Error checking answer:', error);
     }
 }
 
 function displayProgress() {
-    if (!localProgress || !allWords.length) return;
-
-    const levelWords = getLevelWords();
-    const wp = localProgress.word_progress;
+    if (!localProgress || !getLevelWords().length) return;
 
-    const masteredCountVal = levelWords.filter(w => wp[String(w.id)]?.mastered).length;
+    // Counts come from the selection index, which recordAnswer() keeps current
+    const index = getSelectionIndex();
+    const total = getLevelWords().length;
+    const masteredCountVal = index.counts.mastered + index.counts.review;
     masteredCount.textContent = masteredCountVal;
-    totalCount.textContent = levelWords.length;
+    totalCount.textContent = total;
 
     // Level-specific accuracy from word_progress totals
-    let levelPracticed = 0, levelCorrect = 0;
-    for (const word of levelWords) {
-        const wordWp = wp[String(word.id)] || {};
-        levelPracticed += wordWp.times_shown || 0;
-        levelCorrect += wordWp.times_correct || 0;
-    }
-    const accuracy = levelPracticed > 0
-        ? Math.round(levelCorrect / levelPracticed * 1000) / 10
+    const accuracy = index.practiced > 0
+        ? Math.round(index.correct / index.practiced * 1000) / 10
         : 0;
     accuracyEl.textContent = accuracy;
 
-    const percentage = levelWords.length > 0 ? (masteredCountVal / levelWords.length) * 100 : 0;
+    const percentage = total > 0 ? (masteredCountVal / total) * 100 : 0;
     progressFill.style.width = `${percentage}%`;
 
-    let activeCount = 0;
-    for (const word of levelWords) {
-        const wordWp = wp[String(word.id)] || {};
-        if (!wordWp.mastered && (wordWp.times_shown || 0) > 0) activeCount++;
-    }
+    const activeCount = index.counts.active;
     activeCountEl.textContent = activeCount;
     reviewBtn.style.display = activeCount > 0 ? 'inline-block' : 'none';
 }
@@ -500,7 +960,7 @@ function showCompletion() {
 
 function enterReviewMode() {
     reviewMode = true;
-    reviewedWordIds = [];
+    startReviewQueue();
     reviewBtn.style.display = 'none';
     reviewModeIndicator.style.display = 'flex';
     loadNextWord();
@@ -508,7 +968,7 @@ function enterReviewMode() {
 
 function exitReviewMode() {
     reviewMode = false;
-    reviewedWordIds = [];
+    reviewQueue = null;
     reviewModeIndicator.style.display = 'none';
     displayProgress();
     loadNextWord();
@@ -520,7 +980,9 @@ async function loadSettings() {
         const data = await response.json();
         currentStrictness = data.strictness;
         currentTheme = data.theme || 'default';
+        currentScheduling = data.scheduling || 'mastery';
         updateStrictnessUI();
+        updateSchedulingUI();
         applyTheme(currentTheme);
         updateThemeUI();
     } catch (error) {
@@ -556,6 +1018,50 @@ async function setStrictness(value) {
     }
 }
 
+function updateDirectionUI() {
+    directionForwardBtn.classList.toggle('active', currentDirection === 'forward');
+    directionReverseBtn.classList.toggle('active', currentDirection === 'reverse');
+}
+
+async function setDirection(direction) {
+    if (direction === currentDirection) return;
+    currentDirection = direction;
+    localProgress.settings.direction = direction;
+    saveLocalProgress();
+    updateDirectionUI();
+    if (reviewMode) {
+        reviewMode = false;
+        reviewQueue = null;
+        reviewModeIndicator.style.display = 'none';
+    }
+    try {
+        await loadLevelWords(currentLevel);
+    } catch (error) {
+        console.error('Error loading words:', error);
+    }
+    displayProgress();
+    loadNextWord();
+}
+
+function updateSchedulingUI() {
+    schedulingMasteryBtn.classList.toggle('active', currentScheduling === 'mastery');
+    schedulingSpacedBtn.classList.toggle('active', currentScheduling === 'sm2');
+}
+
+async function setScheduling(value) {
+    try {
+        await fetch('/api/settings', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ scheduling: value })
+        });
+        currentScheduling = value;
+        updateSchedulingUI();
+    } catch (error) {
+        console.error('Error saving settings:', error);
+    }
+}
+
 function openThemeModal() { themeModalOverlay.style.display = 'flex'; }
 function closeThemeModal() { themeModalOverlay.style.display = 'none'; }
 
@@ -598,8 +1104,14 @@ function confirmReset() {
 async function resetProgress() {
     try {
         localStorage.removeItem(STORAGE_KEY);
+        for (const direction of DIRECTIONS) localStorage.removeItem(syncKey(direction));
+        pendingAnswers = [];
+        savePendingAnswers();
+        selectionIndex = null;
         initProgress();
-        await fetch('/api/reset', { method: 'POST' });
+        initSyncState();
+        await fetch(`/api/reset?deck=${encodeURIComponent(DECK)}`, { method: 'POST' });
+        await loadLevelWords(currentLevel);
         updateLevelUI();
         displayProgress();
         loadNextWord();
@@ -0,0 +1,291 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from learner_index import MASTERY, build_learner_index
+
+logger = logging.getLogger(__name__)
+
+
+class UserState:
+    """One learner's progress held in memory, with changes not yet written back.
+
+    Counter changes are kept as deltas and word records as last-writer-wins
+    rows, so a write-back merges cleanly with writes from other workers.
+    """
+
+    def __init__(self, user_id, progress, revision):
+        self.user_id = user_id
+        self.progress = progress
+        self.revision = revision
+        self.stale = False
+        self.lock = threading.RLock()
+        self.dirty_words = set()
+        self.dirty_settings = set()
+        self.pending_practiced = 0
+        self.pending_correct = 0
+        self._index = None
+        self._index_key = None
+
+    @property
+    def dirty(self):
+        return bool(self.dirty_words or self.dirty_settings or self.pending_practiced)
+
+    @property
+    def word_progress(self):
+        return self.progress['word_progress']
+
+    @property
+    def settings(self):
+        return self.progress['settings']
+
+    def learner_index(self, catalog, scheduling=None):
+        """Next-word selection index for this learner, rebuilt if the catalog or scheduling mode changed.
+
+        The scheduling mode defaults to this learner's own setting.
+        """
+        key = (catalog.version, scheduling or self.settings.get('scheduling', MASTERY))
+        if self._index is None or self._index_key != key:
+            self._index = build_learner_index(catalog, self.word_progress, key[1])
+            self._index_key = key
+        return self._index
+
+    def record_answer(self, word_id, wp, is_correct):
+        word_id = str(word_id)
+        stats = self.progress['user_stats']
+        self.word_progress[word_id] = wp
+        stats['total_practiced'] += 1
+        if is_correct:
+            stats['total_correct'] += 1
+        stats['last_session'] = datetime.now().isoformat()
+        self.dirty_words.add(word_id)
+        self.pending_practiced += 1
+        if is_correct:
+            self.pending_correct += 1
+        if self._index is not None:
+            self._index.update(word_id, wp)
+
+    def apply_synced(self, words, user_stats, revision):
+        """Take in records another device wrote, as merged by ProgressStore.sync."""
+        for word_id, wp in words.items():
+            self.word_progress[word_id] = wp
+            if self._index is not None:
+                self._index.update(word_id, wp)
+        self.progress['user_stats'].update(user_stats)
+        self.revision = revision
+
+    def update_settings(self, changes):
+        self.settings.update(changes)
+        self.dirty_settings.update(changes)
+
+    def take_changes(self):
+        """Hand over pending changes for writing and clear them."""
+        changes = {
+            'words': {w: self.word_progress[w] for w in self.dirty_words if w in self.word_progress},
+            'settings': {k: self.settings[k] for k in self.dirty_settings},
+            'practiced': self.pending_practiced,
+            'correct': self.pending_correct,
+            'last_session': self.progress['user_stats']['last_session'],
+        }
+        self.dirty_words = set()
+        self.dirty_settings = set()
+        self.pending_practiced = 0
+        self.pending_correct = 0
+        return changes
+
+    def restore_changes(self, changes):
+        """Take back changes from take_changes() that could not be written."""
+        self.dirty_words.update(changes['words'])
+        self.dirty_settings.update(changes['settings'])
+        self.pending_practiced += changes['practiced']
+        self.pending_correct += changes['correct']
+
+
+class UserStateCache:
+    """Bounded LRU of hot UserStates in front of a ProgressStore, with write-behind.
+
+    Answers and settings changes only touch the in-memory state; a
+    background thread writes dirty users back every `flush_interval`
+    seconds, or sooner once some user has `flush_every` answers pending,
+    so requests never wait on the disk. At most `flush_interval` seconds of
+    changes can be lost if the process dies without calling close().
+    Evicted users are still written back straight away. Each lookup costs
+    one primary-key read of the user's revision to notice writes made by
+    other workers, so it does not depend on how many users exist.
+    """
+
+    def __init__(self, store, capacity=1024, flush_every=20, flush_interval=2.0):
+        self.store = store
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher = None
+        self._flusher_pid = None
+
+    def _ensure_flusher(self):
+        # Threads do not survive a fork, so each worker starts its own on first use
+        if self._flusher_pid == os.getpid() or self._closed:
+            return
+        with self._lock:
+            if self._flusher_pid != os.getpid():
+                self._flusher = threading.Thread(target=self._flush_loop, name='progress-flusher', daemon=True)
+                self._flusher_pid = os.getpid()
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush_dirty()
+            except Exception:
+                # Failed users stay dirty; keep the thread alive to retry them next round
+                logger.exception('progress write-back failed')
+
+    def _mark_dirty(self, state):
+        with self._lock:
+            self._dirty[state.user_id] = state
+        self._ensure_flusher()
+
+    def get(self, user_id):
+        revision = self.store.revision(user_id)
+        with self._lock:
+            state = self._entries.get(user_id)
+            if state is not None:
+                self._entries.move_to_end(user_id)
+        if state is not None:
+            with state.lock:
+                if not state.stale and state.revision == revision:
+                    return state
+                # Someone else wrote this user; push our changes and reload
+                self.flush(state)
+        progress, revision = self.store.load(user_id)
+        state = UserState(user_id, progress, revision)
+        with self._lock:
+            self._entries[user_id] = state
+            self._entries.move_to_end(user_id)
+            evicted = []
+            while len(self._entries) > self.capacity:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for old in evicted:
+            self.flush(old)
+        return state
+
+    def setting(self, user_id, key, default=None):
+        """One of a user's settings, without loading (or caching) the user if not already hot."""
+        with self._lock:
+            state = self._entries.get(user_id) or self._dirty.get(user_id)
+        if state is not None:
+            return state.settings.get(key, default)
+        return self.store.setting(user_id, key, default)
+
+    def record_answer(self, state, word_id, wp, is_correct):
+        with state.lock:
+            state.record_answer(word_id, wp, is_correct)
+            pending = state.pending_practiced
+        self._mark_dirty(state)
+        if pending >= self.flush_every:
+            self._wake.set()
+
+    def update_settings(self, state, changes):
+        with state.lock:
+            state.update_settings(changes)
+        self._mark_dirty(state)
+
+    def sync(self, state, since, words, practiced=0, correct=0):
+        """Merge a device's changes through the store and keep the cached state in step."""
+        with state.lock:
+            self.flush(state)
+            result = self.store.sync(state.user_id, since, words, practiced, correct)
+            if state.stale or result['previous'] != state.revision or result['reset']:
+                state.stale = True
+            else:
+                state.apply_synced(result['accepted'], result['user_stats'], result['revision'])
+        return result
+
+    def flush(self, state):
+        """Write one user's pending changes back to the store."""
+        with state.lock:
+            if not state.dirty:
+                return
+            changes = state.take_changes()
+            try:
+                previous, revision = self.store.apply(state.user_id, **changes)
+            except Exception:
+                # e.g. 'database is locked'; keep the changes for the next flush
+                state.restore_changes(changes)
+                self._mark_dirty(state)
+                raise
+            if previous == state.revision:
+                state.revision = revision
+            else:
+                # Another worker wrote in between; reload on next access
+                state.stale = True
+
+    def flush_dirty(self):
+        """Write back every user changed since the last flush.
+
+        A user whose write fails stays dirty; the others are still written
+        and the first error is raised afterwards.
+        """
+        with self._lock:
+            states = list(self._dirty.values())
+            self._dirty = {}
+        self._flush_each(states)
+
+    def flush_all(self):
+        with self._lock:
+            states = list(self._entries.values()) + list(self._dirty.values())
+            self._dirty = {}
+        self._flush_each(states)
+
+    def _flush_each(self, states):
+        error = None
+        for state in states:
+            try:
+                self.flush(state)
+            except Exception as exc:
+                error = error or exc
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Stop the background flusher and write everything back (worker exit)."""
+        self._closed = True
+        self._wake.set()
+        flusher = self._flusher
+        if flusher is not None and self._flusher_pid == os.getpid() and flusher is not threading.current_thread():
+            flusher.join()
+        self.flush_all()
+
+    def evict(self, matches):
+        """Write back and forget every cached user whose id `matches`.
+
+        Used when a deck is unloaded, so its learners' indexes stop holding
+        on to the deck's catalog. A failed write keeps that user dirty.
+        """
+        with self._lock:
+            user_ids = [user_id for user_id in self._entries if matches(user_id)]
+            states = [self._entries.pop(user_id) for user_id in user_ids]
+            states += [self._dirty.pop(user_id) for user_id in list(self._dirty) if matches(user_id)]
+        try:
+            self._flush_each(states)
+        except Exception:
+            logger.exception('progress write-back failed')
+
+    def reset(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            state = self._dirty.pop(user_id, None)
+        if state is not None:
+            # Drop unwritten changes so they cannot resurface after the reset
+            with state.lock:
+                state.take_changes()
+        self.store.reset(user_id)